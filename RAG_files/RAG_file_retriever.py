@@ -1,25 +1,36 @@
+import asyncio
 import logging
 import sqlite3
+import time
+from functools import lru_cache
 
 from chromadb.config import Settings
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains.history_aware_retriever import create_history_aware_retriever
 from langchain.chains.retrieval import create_retrieval_chain
-from langchain_community.vectorstores import Chroma
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from Configuration_files import config
+from RAG_files.context_packing import pack_documents
+from RAG_files.hybrid_retriever import get_retriever, merge_rankings, RETRIEVER_MODE
+from util.answer_cache import lookup_answer, store_answer
+from util.db_manager import connect_db, find_reference_ids
+from util.executor import run_blocking
+from util.llm_clients import get_chat_model
+from util.session_store import SQLiteChatMessageHistory
+from util.vector_store_registry import get_vector_store
 
 logger = logging.getLogger(__name__)
 
+# Model answering RAG questions, also used to pick its context token budget
+RAG_MODEL = "gpt-3.5-turbo"
+
 # Configure ChromaDB to use SQLite
 Settings(chroma_db_impl="sqlite")
 
-store_session = {}
-
 
 def retrieve_file_info(index, sqlite_conn):
     """
@@ -50,29 +61,37 @@ def retrieve_documents(reference_id):
     Retrieve document embeddings and metadata from ChromaDB using the reference ID.
     """
     try:
-        vector_store = Chroma(persist_directory="chromadb_persist/", embedding_function=OpenAIEmbeddings(),
-                              collection_name=f"document_embeddings_{reference_id}")
+        # Collection handles and the embedding client are shared process-wide
+        vector_store = get_vector_store(f"document_embeddings_{reference_id}")
         return vector_store
     except Exception as e:
         logger.error(f"Error retrieving documents: {e}\n\nError id : ETF-DBE-10")
         raise
 
 
-def get_session_history(session_id: str) -> BaseChatMessageHistory:
+def get_session_history(session_id: str | None) -> BaseChatMessageHistory:
     """
     Retrieve chat message history for the given session ID.
+
+    Requests without a session ID get an empty history that is discarded after the request.
     """
-    if session_id not in store_session:
-        store_session[session_id] = ChatMessageHistory()
-    return store_session[session_id]
+    if session_id is None:
+        return ChatMessageHistory()
+    return SQLiteChatMessageHistory(session_id)
 
 
-def create_history_aware_rag_chain(vector_store):
+def session_key(ref_id, session_id):
     """
-    Create a vector store retriever from a document or web content and set up a conversational chain.
+    Key of a conversation's history: the same session ID used with another document gets a history of its own.
+    """
+    return f"{ref_id}:{session_id}" if session_id else None
+
+
+@lru_cache(maxsize=None)
+def get_rag_prompts():
+    """
+    Build the contextualize-question and answer prompts once per process.
     """
-    llm = ChatOpenAI(model="gpt-3.5-turbo")
-    retriever = vector_store.as_retriever(search_type="similarity")
     system_prompt = (
         "You are an assistant for question-answering tasks. "
         "Use the following pieces of retrieved context to answer and analyse "
@@ -99,10 +118,6 @@ def create_history_aware_rag_chain(vector_store):
         ]
     )
 
-    history_aware_retriever = create_history_aware_retriever(
-        llm, retriever, contextualize_q_prompt
-    )
-
     question_answer_prompt = ChatPromptTemplate.from_messages(
         [
             ("system", system_prompt),
@@ -110,9 +125,27 @@ def create_history_aware_rag_chain(vector_store):
             ("human", "{input}"),
         ]
     )
+    return contextualize_q_prompt, question_answer_prompt
+
+
+def create_history_aware_rag_chain(vector_store, collection_name, retriever_mode=None):
+    """
+    Create a (vector, keyword or hybrid) retriever from a document or web content and set up a conversational chain.
+    """
+    # The LLM client and prompts are shared; only the cheap composition is done per request
+    llm = get_chat_model(RAG_MODEL)
+    retriever = get_retriever(vector_store, collection_name, retriever_mode)
+    contextualize_q_prompt, question_answer_prompt = get_rag_prompts()
+
+    history_aware_retriever = create_history_aware_retriever(
+        llm, retriever, contextualize_q_prompt
+    )
+
+    # Only the most relevant, non-duplicate chunks that fit the model's context budget are stuffed into the prompt
+    packed_retriever = history_aware_retriever | RunnableLambda(lambda documents: pack_documents(documents, RAG_MODEL))
 
     question_answer_chain = create_stuff_documents_chain(llm, question_answer_prompt)
-    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+    rag_chain = create_retrieval_chain(packed_retriever, question_answer_chain)
 
     conversational_rag_chain = RunnableWithMessageHistory(
         rag_chain,
@@ -124,13 +157,104 @@ def create_history_aware_rag_chain(vector_store):
     return conversational_rag_chain
 
 
-def generate_answer_api(ref_id, question):
-    store_session.clear()
+async def generate_answer_api(ref_id, question, retriever_mode=None, session_id=None):
     try:
-        vector_store = retrieve_documents(ref_id)
-        conversational_rag_chain = create_history_aware_rag_chain(vector_store)
-        response = conversational_rag_chain.invoke({"input": question}, config={"configurable": {"session_id": ref_id}})
+        # A similar question about the same collection was answered recently; follow-up questions of a
+        # conversation depend on its history, so they never use the answer cache
+        cached = None if session_id else await run_blocking(lookup_answer, ref_id, question)
+        if cached is not None:
+            return {"user_input": question, "genai_response": cached}
+        # Opening the collection touches disk, the chain itself runs on the event loop
+        vector_store = await run_blocking(retrieve_documents, ref_id)
+        conversational_rag_chain = create_history_aware_rag_chain(vector_store, f"document_embeddings_{ref_id}",
+                                                                  retriever_mode)
+        config = {"configurable": {"session_id": session_key(ref_id, session_id)}}
+        response = await conversational_rag_chain.ainvoke({"input": question}, config=config)
+        if not session_id:
+            await run_blocking(store_answer, ref_id, question, response["answer"])
         return {"user_input": question, "genai_response": response["answer"]}
     except Exception as e:
         logger.error(f"Error generating answer: {e}\n\nerror id : RAG-FRT-40")
         return {"result": "Error generating answer","error_id" : "RAG-FRT-40"}
+
+
+async def stream_answer_api(ref_id, question, retriever_mode=None, session_id=None):
+    """
+    Stream the answer as ("token", ...) events while the LLM generates it, then a final ("answer", ...) event.
+    """
+    try:
+        cached = None if session_id else await run_blocking(lookup_answer, ref_id, question)
+        if cached is not None:
+            yield "answer", {"user_input": question, "genai_response": cached}
+            return
+        vector_store = await run_blocking(retrieve_documents, ref_id)
+        conversational_rag_chain = create_history_aware_rag_chain(vector_store, f"document_embeddings_{ref_id}",
+                                                                  retriever_mode)
+        config = {"configurable": {"session_id": session_key(ref_id, session_id)}}
+        answer = ""
+        async for chunk in conversational_rag_chain.astream({"input": question}, config=config):
+            # The retrieval chain streams its input and context first, then the answer piece by piece
+            token = chunk.get("answer")
+            if token:
+                answer += token
+                yield "token", {"token": token}
+        if not session_id:
+            await run_blocking(store_answer, ref_id, question, answer)
+        yield "answer", {"user_input": question, "genai_response": answer}
+    except Exception as e:
+        logger.error(f"Error streaming answer: {e}\n\nerror id : RAG-FRT-41")
+        yield "error", {"result": "Error generating answer", "error_id": "RAG-FRT-41"}
+
+
+async def search_collection(ref_id, question, retriever_mode, k):
+    """
+    Search one document's collection, returning its hits and the search latency in milliseconds.
+    """
+    start = time.perf_counter()
+    vector_store = await run_blocking(retrieve_documents, ref_id)
+    documents = await get_retriever(vector_store, f"document_embeddings_{ref_id}", retriever_mode, k).ainvoke(question)
+    for document in documents:
+        document.metadata["reference_id"] = ref_id
+    return documents, round((time.perf_counter() - start) * 1000, 1)
+
+
+@lru_cache(maxsize=None)
+def get_answer_chain():
+    """
+    Build the stuff-documents answer chain used over hits merged from several collections.
+    """
+    return create_stuff_documents_chain(get_chat_model(RAG_MODEL), get_rag_prompts()[1])
+
+
+def resolve_reference_ids(ref_ids, title):
+    sqlite_conn = connect_db()
+    try:
+        return find_reference_ids(sqlite_conn, ref_ids, title)
+    finally:
+        sqlite_conn.close()
+
+
+async def generate_multi_answer_api(question, ref_ids=None, title=None, retriever_mode=None, k=4):
+    """
+    Answer a question over several documents: search their collections concurrently, merge the top-k
+    hits and generate once.
+    """
+    try:
+        found = await run_blocking(resolve_reference_ids, ref_ids or [], title)
+        if not found:
+            return {"result": "No stored document matches the given reference ids or title", "error_id": "RAG-FRT-42"}
+        mode = retriever_mode or RETRIEVER_MODE
+        searches = await asyncio.gather(*(search_collection(ref_id, question, mode, k) for ref_id in found))
+        documents = pack_documents(merge_rankings([hits for hits, _ in searches], k, mode), RAG_MODEL)
+        answer = await get_answer_chain().ainvoke({"input": question, "context": documents, "chat_history": []})
+        return {
+            "user_input": question,
+            "genai_response": answer,
+            "sources": list(dict.fromkeys(document.metadata["reference_id"] for document in documents)),
+            # Per collection, to spot slow ones
+            "search_latency_ms": {ref_id: latency for ref_id, (_, latency) in zip(found, searches)},
+            "unknown_reference_ids": [ref_id for ref_id in ref_ids or [] if ref_id not in found],
+        }
+    except Exception as e:
+        logger.error(f"Error generating answer over several documents: {e}\n\nerror id : RAG-FRT-43")
+        return {"result": "Error generating answer", "error_id": "RAG-FRT-43"}
@@ -1,31 +1,59 @@
+import asyncio
+import hashlib
+import json
 import logging
 import os.path
 import re
-import shutil
 import sqlite3
 import uuid
 
 import bs4
 from chromadb.config import Settings
-from langchain_community.document_loaders import YoutubeLoader, word_document, WebBaseLoader, PyPDFLoader, TextLoader, \
+from langchain_community.document_loaders import YoutubeLoader, word_document, WebBaseLoader, TextLoader, \
     UnstructuredPowerPointLoader, UnstructuredCSVLoader
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
 from Configuration_files import config
+from RAG_files.chunking import chunk_documents
+from RAG_files.global_index import add_to_global_index
+from RAG_files.inverted_index import add_chunks
+from RAG_files.pdf_parser import load_pdf
+from RAG_files.web_fetcher import bs4_strainer, fetch_pages
+from util.answer_cache import invalidate_answers, GLOBAL_SCOPE
+from util.db_manager import connect_db, find_reference_by_hash
+from util.vector_store_registry import get_vector_store, get_embedding_function
+from util.job_queue import create_job, update_job, get_job, get_unfinished_job_ids, submit_job, claim_job, \
+    has_earlier_pending_job, get_waiting_job_ids
 
 logger = logging.getLogger(__name__)
 
+# Number of chunks sent to the embedding provider per request during bulk ingestion
+BULK_EMBED_BATCH_SIZE = int(os.getenv("BULK_EMBED_BATCH_SIZE", "512"))
+
 # Configure ChromaDB to use SQLite
 Settings(chroma_db_impl="sqlite")
 
 
+def get_filetype(filepath):
+    """
+    Return the filetype (extension) of a file path.
+    """
+    return re.findall("\.(.*)", filepath)[0]
+
+
+def get_link_type(web_link):
+    """
+    Return the chunking filetype of a web link.
+    """
+    return "youtube" if "youtube" in web_link else "web"
+
+
 def doc_loader(filepath):
     """
     Load a document based on its filetype.
     """
-    filetype = re.findall("\.(.*)", filepath)[0]
+    filetype = get_filetype(filepath)
     if filetype == "pdf":
-        loader = PyPDFLoader(file_path=filepath,extract_images=True)
+        # Pages (and their image OCR) are parsed in parallel with cached OCR results
+        return load_pdf(filepath)
     elif filetype == "docx":
         loader = word_document.UnstructuredWordDocumentLoader(file_path=filepath, mode="single")
     elif filetype == "pptx":
@@ -41,109 +69,399 @@ def webloader(web_link):
     """
     Load content from a web link. Handles YouTube and other web links.
     """
-    bs4_strainer = bs4.SoupStrainer(class_=("post-title", "post-header", "post-content"))
     if "youtube" in web_link:
         loader = YoutubeLoader.from_youtube_url(youtube_url=web_link)
     else:
-        loader = WebBaseLoader(web_paths=(web_link,), bs_kwargs={"parse_only": bs4_strainer})
+        loader = WebBaseLoader(web_paths=(web_link,), bs_kwargs={"parse_only": bs4_strainer()})
     return loader.load()
 
 
+def hash_documents(documents):
+    """
+    SHA-256 digest of the text of loaded documents, so a web link is deduplicated by the content it serves.
+    """
+    digest = hashlib.sha256()
+    for document in documents:
+        digest.update(document.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def insert_reference(sqlite_conn, title, reference_id, content_hash, file_name=None, web_link=None):
+    """
+    Record a stored file or web link in the file_references table.
+    """
+    sqlite_cursor = sqlite_conn.cursor()  # Create a cursor object to interact with the database
+    sqlite_cursor.execute(
+        "INSERT INTO file_references (title, file_name, web_link, reference_id, content_hash) VALUES (?, ?, ?, ?, ?)",
+        (title, file_name, web_link, reference_id, content_hash))
+    # Commit the transaction
+    sqlite_conn.commit()
+
+
 def store_chromadb(text_chunks, reference):
     """
     Store document chunks in ChromaDB with their embeddings.
     """
-    # Initialize ChatOpenAI and other necessary objects
-    store_docs = Chroma.from_documents(documents=text_chunks, embedding=OpenAIEmbeddings(),
-                                       persist_directory="chromadb_persist/",
-                                       collection_name=f"document_embeddings_{reference}")
-    store_docs.persist()
+    collection_name = f"document_embeddings_{reference}"
+    ids = [f"{reference}-{i}" for i in range(len(text_chunks))]
+    # Add the chunks to the document's collection through the shared (persistent) client
+    get_vector_store(collection_name).add_documents(documents=text_chunks, ids=ids)
+    # Index the same chunks for keyword search
+    add_chunks(collection_name, ids, text_chunks, reference)
+    # Keep the merged SRAG index in step with the per-document collections
+    add_to_global_index(text_chunks, reference)
+    # Answers cached before this content existed may now be incomplete; the chunks are stored either way,
+    # so a cache failure must not fail the ingestion
+    try:
+        invalidate_answers(reference, GLOBAL_SCOPE)
+    except Exception as e:
+        logger.error(f"Error invalidating the answer cache: {e}\n\nError id : RAG-FRT-115")
 
 
-def store_links_api(title, web_link, sqlite_conn):
+def ingest_link(title, web_link, sqlite_conn, report_progress=None):
     """
-    Store a web link and its processed data in the database.
+    Load, chunk and embed a web link, then record it in the database.
 
     Parameters:
     title (str): Title of the web link.
     web_link (str): URL of the web link.
     sqlite_conn: SQLite connection object.
+    report_progress (callable): Optional callback receiving (stage, progress) updates.
 
     Returns:
-    dict: Result of the operation.
+    str: Reference ID of the stored link.
     """
-    sqlite_cursor = sqlite_conn.cursor()  # Create a cursor object to interact with the database
-    try:
-        # Load the data from the web link
-        loaded_data = webloader(web_link=web_link)
-        # Generate a unique reference ID
-        reference_id = str(uuid.uuid4())
-        # Store the loaded data in the ChromaDB with the generated reference ID
-        store_chromadb(loaded_data, reference_id)
-        # Insert the web link data into the database
-        sqlite_cursor.execute("INSERT INTO file_references (title, web_link, reference_id) VALUES (?, ?, ?)",
-                              (title, web_link, reference_id))
-        # Commit the transaction
-        sqlite_conn.commit()
-        return {"result": "web link added successfully!"}
-    except (bs4.FeatureNotFound, ValueError) as e:
-        logger.error(f"Error loading web link: {e}\n\nError id : RAG-FRT-194")
-        return {"result": "Error, unable to store the data!", "error_id": "RAG-FRT-194"}
-    except sqlite3.DatabaseError as e:
-        logger.error(f"Database error: {e}\n\nError id : RAG-FRT-294")
-        return {"result": "Error, unable to store the data!", "error_id": "RAG-FRT-294"}
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}\n\nError id : RAG-FRT-102")
-        return {"result": "Error, unable to store the data!", "error_id": "RAG-FRT-102"}
+    report_progress = report_progress or (lambda stage, progress: None)
+    # Load the data from the web link
+    report_progress("loading", 0.1)
+    loaded_data = webloader(web_link=web_link)
+    content_hash = hash_documents(loaded_data)
+    # Re-use the vectors of a page with the same content that is already indexed
+    reference_id = find_reference_by_hash(sqlite_conn, content_hash)
+    if reference_id:
+        report_progress("deduplicated", 0.9)
+        insert_reference(sqlite_conn, title, reference_id, content_hash, web_link=web_link)
+        return reference_id
+    # Split the page into token sized chunks before embedding
+    report_progress("chunking", 0.3)
+    loaded_data = chunk_documents(loaded_data, get_link_type(web_link))
+    # Generate a unique reference ID
+    reference_id = str(uuid.uuid4())
+    # Store the loaded data in the ChromaDB with the generated reference ID
+    report_progress("embedding", 0.4)
+    store_chromadb(loaded_data, reference_id)
+    # Insert the web link data into the database
+    report_progress("saving", 0.9)
+    insert_reference(sqlite_conn, title, reference_id, content_hash, web_link=web_link)
+    return reference_id
 
 
-def upload_docs_api(sqlite_conn, file, title):
+def ingest_file(title, file_name, filepath, content_hash, sqlite_conn, report_progress=None):
     """
-    Upload a document, process its contents, and store the data in the database.
+    Load, chunk and embed a saved file, then record it in the database.
 
     Parameters:
-    sqlite_conn: SQLite connection object.
-    file: File object to be uploaded.
     title (str): Title of the document.
+    file_name (str): Original name of the uploaded file.
+    filepath (str): Path of the saved file on disk.
+    content_hash (str): SHA-256 digest of the file contents.
+    sqlite_conn: SQLite connection object.
+    report_progress (callable): Optional callback receiving (stage, progress) updates.
 
     Returns:
-    dict: Result of the operation.
+    str: Reference ID of the stored file.
+    """
+    report_progress = report_progress or (lambda stage, progress: None)
+    # Re-use the vectors of identical content that is already indexed
+    reference_id = find_reference_by_hash(sqlite_conn, content_hash)
+    if reference_id:
+        report_progress("deduplicated", 0.9)
+        insert_reference(sqlite_conn, title, reference_id, content_hash, file_name=file_name)
+        return reference_id
+    # Load the data from the uploaded file
+    report_progress("loading", 0.1)
+    data = doc_loader(filepath=filepath)
+    # Split the document into token sized chunks before embedding
+    report_progress("chunking", 0.3)
+    data = chunk_documents(data, get_filetype(filepath))
+    # Generate a unique reference ID
+    reference_id = str(uuid.uuid4())
+    # Store the loaded data in the ChromaDB with the generated reference ID
+    report_progress("embedding", 0.4)
+    store_chromadb(data, reference_id)
+    # Insert the file data into the database
+    report_progress("saving", 0.9)
+    insert_reference(sqlite_conn, title, reference_id, content_hash, file_name=file_name)
+    return reference_id
+
+
+def save_upload(file):
+    """
+    Stream an uploaded file into the uploads directory while hashing it.
+
+    Returns:
+    tuple: Path of the saved file and the SHA-256 digest of its contents.
     """
-    sqlite_cursor = sqlite_conn.cursor()  # Create a cursor object to interact with the database
     upload_dir = os.path.join(os.getcwd(), 'uploads')  # Define the upload directory
 
     # Create the upload directory if it doesn't exist
     if not os.path.exists(upload_dir):
         os.makedirs(upload_dir)
 
-    # Define the destination path for the uploaded file
-    dest = os.path.join(upload_dir, file.filename)
+    # Prefix the file with a fresh id so concurrent uploads with the same name don't overwrite each other
+    dest = os.path.join(upload_dir, f"{uuid.uuid4().hex}_{file.filename}")
+    digest = hashlib.sha256()
+    # Save the uploaded file to the destination path, hashing each block as it is written
+    with open(dest, "wb") as buffer:
+        for block in iter(lambda: file.file.read(1024 * 1024), b""):
+            digest.update(block)
+            buffer.write(block)
+    return dest, digest.hexdigest()
+
+
+def queue_link_upload(sqlite_conn, title, web_link):
+    """
+    Queue a web link for background ingestion.
+
+    Returns:
+    dict: Result of the operation with the id of the queued job.
+    """
+    # Links are deduplicated by the content of the page, which the worker fetches
+    job_id = create_job(sqlite_conn, "link", title, web_link)
+    submit_job(run_ingestion_job, job_id)
+    return {"result": "web link queued for ingestion", "job_id": job_id}
+
+
+def queue_file_upload(sqlite_conn, file, title):
+    """
+    Save an uploaded file and queue it for background ingestion.
+
+    Returns:
+    dict: Result of the operation with the id of the queued job.
+    """
+    dest, content_hash = save_upload(file)
+    job_id = None
+    try:
+        reference_id = find_reference_by_hash(sqlite_conn, content_hash)
+        if reference_id:
+            # Identical content is already indexed: only record the new entry
+            os.remove(dest)
+            insert_reference(sqlite_conn, title, reference_id, content_hash, file_name=file.filename)
+            return {"result": "file added successfully!", "reference_id": reference_id}
+        job_id = create_job(sqlite_conn, "file", title, dest, file_name=file.filename, content_hash=content_hash)
+        submit_job(run_ingestion_job, job_id)
+    except Exception:
+        # No worker will pick the saved upload up; keep the job from being resumed without its file
+        if os.path.exists(dest):
+            os.remove(dest)
+        if job_id:
+            update_job(sqlite_conn, job_id, status="failed", stage="failed")
+        raise
+    return {"result": "file queued for ingestion", "job_id": job_id}
+
+
+def ingest_bulk(links, files, sqlite_conn, report_progress=None, client=None):
+    """
+    Ingest many web links and saved files at once.
+
+    Pages are fetched concurrently over one pooled HTTP client, all chunks are embedded in large batches and
+    every file_references row is inserted in a single transaction.
+
+    Parameters:
+    links (list): Dictionaries with "title" and "data" (the URL).
+    files (list): Dictionaries with "title", "file_name", "path" and "content_hash" of saved uploads.
+    sqlite_conn: SQLite connection object.
+    report_progress (callable): Optional callback receiving (stage, progress) updates.
+    client (httpx.AsyncClient): Optional HTTP client, e.g. one pointed at a local stand-in server.
+
+    Returns:
+    list: Per item result with its reference ID or error.
+    """
+    report_progress = report_progress or (lambda stage, progress: None)
+    items = [{"title": link.get("title"), "web_link": link["data"], "status": "new"} for link in links]
+    items += [{"title": file["title"], "file_name": file["file_name"], "path": file["path"],
+               "content_hash": file["content_hash"], "status": "new"} for file in files]
+
+    # Fetch the links first: they are deduplicated by the digest of their content
+    report_progress("loading", 0.1)
+    link_items = [item for item in items if "web_link" in item]
+    pages = [item["web_link"] for item in link_items if get_link_type(item["web_link"]) == "web"]
+    fetched = asyncio.run(fetch_pages(pages, client=client)) if pages else {}
+    for item in link_items:
+        try:
+            if item["web_link"] in fetched:
+                result = fetched[item["web_link"]]
+                if isinstance(result, Exception):
+                    raise result
+                item["documents"] = [result]
+            else:
+                item["documents"] = webloader(item["web_link"])
+            item["content_hash"] = hash_documents(item["documents"])
+        except Exception as e:
+            logger.error(f"Error loading {item['web_link']}: {e}\n\nError id : RAG-BLK-88")
+            item["status"], item["error_id"] = "failed", "RAG-BLK-88"
+
+    # Re-use indexed content and content repeated within this batch
+    new_references = {}
+    for item in items:
+        if item["status"] == "failed":
+            continue
+        reference_id = new_references.get(item["content_hash"]) or find_reference_by_hash(sqlite_conn,
+                                                                                           item["content_hash"])
+        if reference_id:
+            item["reference_id"], item["status"] = reference_id, "deduplicated"
+        else:
+            item["reference_id"] = new_references[item["content_hash"]] = str(uuid.uuid4())
+    new_items = [item for item in items if item["status"] == "new"]
+
+    # Load the files and chunk everything that has to be indexed
+    for item in new_items:
+        try:
+            if "web_link" in item:
+                item["chunks"] = chunk_documents(item["documents"], get_link_type(item["web_link"]))
+            else:
+                item["chunks"] = chunk_documents(doc_loader(item["path"]), get_filetype(item["path"]))
+        except Exception as e:
+            logger.error(f"Error loading {item.get('web_link') or item['file_name']}: {e}\n\nError id : RAG-BLK-88")
+            item["status"], item["error_id"] = "failed", "RAG-BLK-88"
+
+    # Embed all chunks in large batches; storing them afterwards only hits the embedding cache
+    report_progress("embedding", 0.4)
+    loaded = [item for item in new_items if item["status"] == "new"]
+    texts = [chunk.page_content for item in loaded for chunk in item["chunks"]]
+    embeddings = get_embedding_function()
+    for start in range(0, len(texts), BULK_EMBED_BATCH_SIZE):
+        embeddings.embed_documents(texts[start:start + BULK_EMBED_BATCH_SIZE])
+        report_progress("embedding", 0.4 + 0.4 * min(start + BULK_EMBED_BATCH_SIZE, len(texts)) / len(texts))
+    for item in loaded:
+        try:
+            store_chromadb(item["chunks"], item["reference_id"])
+        except Exception as e:
+            logger.error(f"Error storing {item['reference_id']}: {e}\n\nError id : RAG-BLK-102")
+            item["status"], item["error_id"] = "failed", "RAG-BLK-102"
+
+    # Duplicates of content that failed within this batch have nothing to point at
+    failed_references = {item["reference_id"] for item in new_items if item["status"] == "failed"}
+    for item in items:
+        if item["status"] == "deduplicated" and item["reference_id"] in failed_references:
+            item["status"], item["error_id"] = "failed", "RAG-BLK-88"
+
+    # Record every stored item in one transaction
+    report_progress("saving", 0.9)
+    stored = [item for item in items if item["status"] != "failed"]
+    sqlite_conn.executemany(
+        "INSERT INTO file_references (title, file_name, web_link, reference_id, content_hash) VALUES (?, ?, ?, ?, ?)",
+        [(item["title"], item.get("file_name"), item.get("web_link"), item["reference_id"], item["content_hash"])
+         for item in stored])
+    sqlite_conn.commit()
+
+    return [{"title": item["title"], "source": item.get("web_link") or item["file_name"], "status": item["status"],
+             "reference_id": item["reference_id"] if item["status"] != "failed" else None,
+             "error_id": item.get("error_id")} for item in items]
+
+
+def queue_bulk_upload(sqlite_conn, links, files, file_titles=None):
+    """
+    Save the uploaded files and queue the links and files for bulk background ingestion.
+
+    Parameters:
+    sqlite_conn: SQLite connection object.
+    links (list): Dictionaries with "title" and "data" (the URL).
+    files (list): Uploaded file objects.
+    file_titles (list): Optional titles of the files, defaulting to their file names.
+
+    Returns:
+    dict: Result of the operation with the id of the queued job.
+    """
+    file_titles = file_titles or []
+    saved_files = []
+    job_id = None
     try:
-        # Save the uploaded file to the destination path
-        with open(dest, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Load the data from the uploaded file
-        data = doc_loader(filepath=dest)
-        # Generate a unique reference ID
-        reference_id = str(uuid.uuid4())
-        # Store the loaded data in the ChromaDB with the generated reference ID
-        store_chromadb(data, reference_id)
-        # Insert the file data into the database
-        sqlite_cursor.execute("INSERT INTO file_references (title, file_name, reference_id) VALUES (?, ?, ?)",
-                              (title, file.filename, reference_id))
-        # Commit the transaction
-        sqlite_conn.commit()
-        return {"result": "file added successfully!"}
+        for position, file in enumerate(files):
+            dest, content_hash = save_upload(file)
+            title = file_titles[position] if position < len(file_titles) else file.filename
+            saved_files.append({"title": title, "file_name": file.filename, "path": dest,
+                                "content_hash": content_hash})
+        payload = json.dumps({"links": links, "files": saved_files})
+        job_id = create_job(sqlite_conn, "bulk", f"bulk upload of {len(links) + len(saved_files)} items", payload)
+        submit_job(run_ingestion_job, job_id)
+    except Exception:
+        # No worker will pick the saved uploads up; keep the job from being resumed without its files
+        for saved_file in saved_files:
+            if os.path.exists(saved_file["path"]):
+                os.remove(saved_file["path"])
+        if job_id:
+            update_job(sqlite_conn, job_id, status="failed", stage="failed")
+        raise
+    return {"result": "bulk upload queued for ingestion", "job_id": job_id}
+
+
+def run_ingestion_job(job_id):
+    """
+    Worker entry point: ingest the file or link of a queued job and record its outcome.
+    """
+    sqlite_conn = connect_db()  # Workers use their own connection, possibly in another process
+    job = None
+    try:
+        job = get_job(sqlite_conn, job_id)
+        if job is None:
+            logger.error(f"Ingestion job {job_id} does not exist\n\nError id : RAG-JOB-40")
+            return
+        if job["kind"] == "file" and has_earlier_pending_job(sqlite_conn, job_id, job["content_hash"]):
+            # An identical upload is still being ingested; its worker runs this job once it is done
+            job = None
+            return
+        if not claim_job(sqlite_conn, job_id):
+            # Already taken (e.g. resumed by several server processes): its uploads belong to the other worker
+            job = None
+            return
+
+        def report_progress(stage, progress):
+            update_job(sqlite_conn, job_id, stage=stage, progress=progress)
+
+        if job["kind"] == "bulk":
+            payload = json.loads(job["payload"])
+            result = {"items": ingest_bulk(payload["links"], payload["files"], sqlite_conn, report_progress)}
+        elif job["kind"] == "link":
+            result = {"reference_id": ingest_link(job["title"], job["payload"], sqlite_conn, report_progress)}
+        else:
+            result = {"reference_id": ingest_file(job["title"], job["file_name"], job["payload"],
+                                                  job["content_hash"], sqlite_conn, report_progress)}
+        update_job(sqlite_conn, job_id, status="done", stage="done", progress=1.0, result=result)
+    except (bs4.FeatureNotFound, ValueError) as e:
+        logger.error(f"Error loading job {job_id}: {e}\n\nError id : RAG-JOB-194")
+        update_job(sqlite_conn, job_id, status="failed", error_id="RAG-JOB-194")
     except FileNotFoundError as e:
-        logger.error(f"File not found error: {e}\n\nError id : RAG-FRT-105")
-        return {"result": "Error! file cannot be processed", "error_id": "RAG-FRT-105"}
+        logger.error(f"File not found for job {job_id}: {e}\n\nError id : RAG-JOB-105")
+        update_job(sqlite_conn, job_id, status="failed", error_id="RAG-JOB-105")
     except sqlite3.DatabaseError as e:
-        logger.error(f"Database error: {e}\n\nError id : RAG-FRT-130")
-        return {"result": "Error! file cannot be processed", "error_id": "RAG-FRT-130"}
+        logger.error(f"Database error in job {job_id}: {e}\n\nError id : RAG-JOB-130")
+        update_job(sqlite_conn, job_id, status="failed", error_id="RAG-JOB-130")
     except Exception as e:
-        logger.error(f"Unexpected error: {e}\n\nError id : RAG-FRT-452")
-        return {"result": "Error! file cannot be processed", "error_id": "RAG-FRT-452"}
+        logger.error(f"Unexpected error in job {job_id}: {e}\n\nError id : RAG-JOB-452")
+        update_job(sqlite_conn, job_id, status="failed", error_id="RAG-JOB-452")
     finally:
-        # Remove the file from the destination path
-        os.remove(dest)
+        # Remove the saved uploads once the job has finished, whatever the outcome
+        if job and job["kind"] == "file":
+            saved_paths = [job["payload"]]
+        elif job and job["kind"] == "bulk":
+            saved_paths = [file["path"] for file in json.loads(job["payload"])["files"]]
+        else:
+            saved_paths = []
+        for saved_path in saved_paths:
+            if os.path.exists(saved_path):
+                os.remove(saved_path)
+        waiting_ids = get_waiting_job_ids(sqlite_conn, job_id, job["content_hash"]) if job and job["kind"] == "file" \
+            else []
+        sqlite_conn.close()
+    # Identical uploads queued meanwhile now re-use the stored vectors, or take over if this job failed
+    for waiting_id in waiting_ids:
+        run_ingestion_job(waiting_id)
+
+
+def resume_ingestion_jobs(sqlite_conn):
+    """
+    Re-submit the jobs that were queued, or whose worker stopped without finishing them.
+    """
+    for job_id in get_unfinished_job_ids(sqlite_conn):
+        submit_job(run_ingestion_job, job_id)
@@ -0,0 +1,59 @@
+import logging
+import os
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+# Token based defaults, overridable through the environment
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+CHUNK_ENCODING = os.getenv("CHUNK_ENCODING", "cl100k_base")
+
+# Per-filetype chunking strategy; keys missing from a strategy fall back to the defaults above
+CHUNKING_STRATEGIES = {
+    "pdf": {"separators": ["\n\n", "\n", ". ", " ", ""]},
+    "docx": {"separators": ["\n\n", "\n", ". ", " ", ""]},
+    "pptx": {"separators": ["\n\n", "\n", " ", ""], "chunk_size": 300},
+    # Keep csv rows intact and do not repeat rows across chunks
+    "csv": {"separators": ["\n", ""], "chunk_overlap": 0},
+    "txt": {"separators": ["\n\n", "\n", " ", ""]},
+    "web": {"separators": ["\n\n", "\n", ". ", " ", ""]},
+    "youtube": {"separators": [". ", " ", ""], "chunk_size": 300},
+}
+
+
+def get_text_splitter(filetype):
+    """
+    Build the token based text splitter for the given filetype.
+    """
+    strategy = CHUNKING_STRATEGIES.get(filetype, {})
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=CHUNK_ENCODING,
+        chunk_size=strategy.get("chunk_size", CHUNK_SIZE_TOKENS),
+        chunk_overlap=strategy.get("chunk_overlap", CHUNK_OVERLAP_TOKENS),
+        separators=strategy.get("separators"),
+        add_start_index=True,
+    )
+
+
+def chunk_documents(documents, filetype):
+    """
+    Split loaded documents into token sized chunks and record each chunk's offsets in its metadata.
+
+    Parameters:
+    documents (list): Documents returned by doc_loader or webloader.
+    filetype (str): Key of CHUNKING_STRATEGIES, e.g. "pdf" or "web".
+
+    Returns:
+    list: Chunked documents with start_index, end_index and chunk_index metadata.
+    """
+    chunks = get_text_splitter(filetype).split_documents(documents)
+    for chunk_index, chunk in enumerate(chunks):
+        start_index = chunk.metadata.get("start_index", -1)
+        # start_index is a character offset into the source document (or page), -1 when not located
+        chunk.metadata["end_index"] = start_index + len(chunk.page_content) if start_index >= 0 else -1
+        chunk.metadata["chunk_index"] = chunk_index
+        chunk.metadata["filetype"] = filetype
+    logger.info(f"Split {len(documents)} document(s) of type {filetype} into {len(chunks)} chunks")
+    return chunks
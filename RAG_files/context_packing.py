@@ -0,0 +1,89 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from util.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens of retrieved context allowed in a prompt, per model, with a default for other models
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_TOKEN_BUDGETS = json.loads(os.getenv("CONTEXT_TOKEN_BUDGETS", '{"gpt-3.5-turbo": 3000, "gpt-4o": 8000}'))
+# Estimated Jaccard similarity of word shingles above which a chunk is a near duplicate of a kept one
+DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 64
+MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed, so signatures are comparable across calls and processes
+_random = np.random.RandomState(7)
+PERMUTATION_A = _random.randint(1, MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+PERMUTATION_B = _random.randint(0, MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def shingles(text):
+    """
+    Word shingles of a text; short texts form a single shingle.
+    """
+    words = text.lower().split()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    """
+    MinHash signature of a text's shingles.
+    """
+    hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+                       for shingle in shingles(text)], dtype=np.uint64) % np.uint64(MERSENNE_PRIME)
+    # Universal hashing (a * x + b) mod p, one row per permutation; uint64 arithmetic wraps like the
+    # reference implementation, which is fine for estimating similarity
+    permuted = (np.outer(PERMUTATION_A, hashes) + PERMUTATION_B[:, None]) % np.uint64(MERSENNE_PRIME)
+    return permuted.min(axis=1)
+
+
+def similarity(signature, other):
+    """
+    Estimated Jaccard similarity of two MinHash signatures.
+    """
+    return float(np.mean(signature == other))
+
+
+def get_token_budget(model):
+    return CONTEXT_TOKEN_BUDGETS.get(model, CONTEXT_TOKEN_BUDGET)
+
+
+def pack_documents(documents, model="gpt-3.5-turbo", budget=None):
+    """
+    Select the documents that go into a prompt.
+
+    Documents are taken in the given order, which retrievers return most relevant first. Near duplicates
+    of an already selected document are dropped, and documents are added while they fit in the model's
+    token budget (a document that does not fit is skipped so that a shorter one after it still can).
+    """
+    budget = budget or get_token_budget(model)
+    packed = []
+    signatures = []
+    used = 0
+    for document in documents:
+        signature = minhash(document.page_content)
+        if any(similarity(signature, kept) >= DEDUP_THRESHOLD for kept in signatures):
+            continue
+        tokens = count_tokens(document.page_content)
+        if used + tokens > budget:
+            continue
+        packed.append(document)
+        signatures.append(signature)
+        used += tokens
+    return packed
+
+
+def format_documents(documents):
+    """
+    Context text of a prompt: the document contents, without their metadata.
+    """
+    return "\n\n".join(document.page_content for document in documents)
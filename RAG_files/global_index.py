@@ -0,0 +1,58 @@
+import logging
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from RAG_files.inverted_index import add_chunks, remove_reference
+from util.vector_store_registry import get_vector_store
+
+logger = logging.getLogger(__name__)
+
+# Name of the persistent collection that merges every stored document for the SRAG retriever
+GLOBAL_INDEX_COLLECTION = "srag_global_index"
+
+
+def get_global_index():
+    """
+    Open the persistent merged collection used by the SRAG retriever.
+    """
+    return get_vector_store(GLOBAL_INDEX_COLLECTION)
+
+
+def split_for_global_index(documents, reference_id):
+    """
+    Split documents into retrieval sized chunks tagged with the reference ID they belong to.
+    """
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(chunk_size=500, chunk_overlap=0)
+    doc_splits = text_splitter.split_documents(documents)
+    for doc_split in doc_splits:
+        doc_split.metadata["reference_id"] = reference_id
+    return doc_splits
+
+
+def add_to_global_index(documents, reference_id):
+    """
+    Add the chunks of a newly stored document to the merged SRAG collection.
+    """
+    doc_splits = split_for_global_index(documents, reference_id)
+    if not doc_splits:
+        return
+    # Deterministic ids make re-adding the same reference an overwrite instead of a duplicate
+    ids = [f"{reference_id}-{i}" for i in range(len(doc_splits))]
+    get_global_index().add_documents(documents=doc_splits, ids=ids)
+    add_chunks(GLOBAL_INDEX_COLLECTION, ids, doc_splits, reference_id)
+
+
+def remove_from_global_index(reference_id):
+    """
+    Remove every chunk of the given reference ID from the merged SRAG collection.
+    """
+    get_global_index()._collection.delete(where={"reference_id": reference_id})
+    remove_reference(GLOBAL_INDEX_COLLECTION, reference_id)
+
+
+def is_in_global_index(reference_id):
+    """
+    Check whether the merged SRAG collection already holds chunks for the given reference ID.
+    """
+    result = get_global_index()._collection.get(where={"reference_id": reference_id}, limit=1)
+    return bool(result["ids"])
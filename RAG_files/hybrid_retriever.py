@@ -0,0 +1,100 @@
+import logging
+import os
+from typing import Any, List, Literal
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from RAG_files.inverted_index import search
+from util.embedding_cache import hash_text
+
+logger = logging.getLogger(__name__)
+
+# "similarity" searches the vectors only, "keyword" the BM25 index only, "hybrid" fuses both
+RetrieverMode = Literal["similarity", "keyword", "hybrid"]
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "hybrid")
+# Candidates taken from each ranking before fusion, and the rank constant of reciprocal rank fusion
+RETRIEVER_FETCH_K = int(os.getenv("RETRIEVER_FETCH_K", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Metadata keys of the per-chunk scores, read by the SRAG relevance pre-filter
+SIMILARITY_KEY = "similarity"
+BM25_KEY = "bm25"
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """
+    Fuse ranked lists of documents; a document's score is the sum of 1 / (rrf_k + rank) over the lists.
+
+    The same chunk found by both searches is recognised by its text.
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = hash_text(document.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            # Keep the first copy, merging in the scores the other search attached
+            if key in documents:
+                documents[key].metadata.update(
+                    {name: value for name, value in document.metadata.items() if name in (SIMILARITY_KEY, BM25_KEY)})
+            else:
+                documents[key] = document
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+def merge_rankings(rankings, k, mode):
+    """
+    Merge the ranked hits of several collections into one top-k.
+
+    Vector relevance scores are comparable across collections, so similarity hits are merged by score;
+    BM25 and fused scores depend on each collection's statistics, so those are merged by rank.
+    """
+    if mode == "similarity":
+        hits = [document for ranking in rankings for document in ranking]
+        return sorted(hits, key=lambda document: document.metadata.get(SIMILARITY_KEY, 0.0), reverse=True)[:k]
+    return reciprocal_rank_fusion(rankings, k)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever over a Chroma collection and its keyword index, fused with reciprocal rank fusion.
+    """
+
+    vector_store: Any
+    collection_name: str
+    mode: str = RETRIEVER_MODE
+    k: int = 4
+    fetch_k: int = RETRIEVER_FETCH_K
+
+    def vector_hits(self, query, k):
+        hits = []
+        for document, score in self.vector_store.similarity_search_with_relevance_scores(query, k=k):
+            document.metadata[SIMILARITY_KEY] = score
+            hits.append(document)
+        return hits
+
+    def keyword_hits(self, query, k):
+        hits = []
+        for document, score in search(self.collection_name, query, k=k, vector_store=self.vector_store):
+            document.metadata[BM25_KEY] = score
+            hits.append(document)
+        return hits
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if self.mode == "similarity":
+            return self.vector_hits(query, self.k)
+        if self.mode == "keyword":
+            return self.keyword_hits(query, self.k)
+        return reciprocal_rank_fusion(
+            [self.vector_hits(query, self.fetch_k), self.keyword_hits(query, self.fetch_k)], self.k)
+
+
+def get_retriever(vector_store, collection_name, mode=None, k=4):
+    """
+    Build the retriever of a collection for the requested mode (RETRIEVER_MODE by default).
+    """
+    return HybridRetriever(vector_store=vector_store, collection_name=collection_name,
+                           mode=mode or RETRIEVER_MODE, k=k)
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from RAG_files.lexical import tokenize, idf, bm25_score
+from util.sqlite_pool import pooled_connect
+
+logger = logging.getLogger(__name__)
+
+# Keyword index kept next to every Chroma collection
+INVERTED_INDEX_PATH = os.getenv("INVERTED_INDEX_PATH", "sqlite3_db/inverted_index.db")
+
+schema_ready = False
+schema_lock = threading.Lock()
+# Collections checked for (and back-filled with) keyword postings in this process
+indexed_collections = set()
+
+
+def connect_index():
+    """
+    Check out a pooled connection to the inverted index, creating its tables once per process.
+    """
+    global schema_ready
+    sqlite_conn = pooled_connect(INVERTED_INDEX_PATH)
+    with schema_lock:
+        if not schema_ready:
+            sqlite_conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (collection TEXT, chunk_id TEXT, reference_id TEXT, content TEXT, "
+                "metadata TEXT, length INTEGER, PRIMARY KEY (collection, chunk_id)) WITHOUT ROWID"
+            )
+            sqlite_conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings (collection TEXT, term TEXT, chunk_id TEXT, tf INTEGER, "
+                "PRIMARY KEY (collection, term, chunk_id)) WITHOUT ROWID"
+            )
+            sqlite_conn.execute("CREATE INDEX IF NOT EXISTS chunks_reference ON chunks (collection, reference_id)")
+            sqlite_conn.commit()
+            schema_ready = True
+    return sqlite_conn
+
+
+def write_chunks(sqlite_conn, collection, chunk_ids, documents, reference_id=None):
+    chunk_rows = []
+    posting_rows = []
+    for chunk_id, document in zip(chunk_ids, documents):
+        term_counts = Counter(tokenize(document.page_content))
+        chunk_rows.append((collection, chunk_id, reference_id or document.metadata.get("reference_id"),
+                           document.page_content, json.dumps(document.metadata), sum(term_counts.values())))
+        posting_rows.extend((collection, term, chunk_id, tf) for term, tf in term_counts.items())
+    # Re-indexing a chunk id replaces its postings
+    sqlite_conn.executemany("DELETE FROM postings WHERE collection=? AND chunk_id=?",
+                            [(collection, chunk_id) for chunk_id in chunk_ids])
+    sqlite_conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)", chunk_rows)
+    sqlite_conn.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?, ?)", posting_rows)
+
+
+def add_chunks(collection, chunk_ids, documents, reference_id=None):
+    """
+    Index the chunks stored in a Chroma collection under the same ids.
+    """
+    sqlite_conn = connect_index()
+    try:
+        write_chunks(sqlite_conn, collection, chunk_ids, documents, reference_id)
+        sqlite_conn.commit()
+    finally:
+        sqlite_conn.close()
+
+
+def remove_reference(collection, reference_id):
+    """
+    Drop the chunks of one reference ID from a collection's index (the merged SRAG collection).
+    """
+    sqlite_conn = connect_index()
+    try:
+        sqlite_conn.execute(
+            "DELETE FROM postings WHERE collection=? AND chunk_id IN "
+            "(SELECT chunk_id FROM chunks WHERE collection=? AND reference_id=?)", (collection, collection, reference_id))
+        sqlite_conn.execute("DELETE FROM chunks WHERE collection=? AND reference_id=?", (collection, reference_id))
+        sqlite_conn.commit()
+    finally:
+        sqlite_conn.close()
+
+
+def remove_collection(collection):
+    """
+    Drop the whole index of a deleted collection.
+    """
+    sqlite_conn = connect_index()
+    try:
+        sqlite_conn.execute("DELETE FROM postings WHERE collection=?", (collection,))
+        sqlite_conn.execute("DELETE FROM chunks WHERE collection=?", (collection,))
+        sqlite_conn.commit()
+    finally:
+        sqlite_conn.close()
+    indexed_collections.discard(collection)
+
+
+def clear_index():
+    """
+    Drop the index of every collection.
+    """
+    sqlite_conn = connect_index()
+    try:
+        sqlite_conn.execute("DELETE FROM postings")
+        sqlite_conn.execute("DELETE FROM chunks")
+        sqlite_conn.commit()
+    finally:
+        sqlite_conn.close()
+    indexed_collections.clear()
+
+
+def ensure_indexed(sqlite_conn, collection, vector_store):
+    """
+    Back-fill the index of a collection stored before keyword indexing existed, from Chroma's stored texts.
+    """
+    if collection in indexed_collections:
+        return
+    if sqlite_conn.execute("SELECT 1 FROM chunks WHERE collection=? LIMIT 1", (collection,)).fetchone() is None:
+        stored = vector_store.get()
+        if stored["ids"]:
+            documents = [Document(page_content=text, metadata=metadata or {})
+                         for text, metadata in zip(stored["documents"], stored["metadatas"])]
+            write_chunks(sqlite_conn, collection, stored["ids"], documents)
+            sqlite_conn.commit()
+    indexed_collections.add(collection)
+
+
+def search(collection, query, k=4, vector_store=None):
+    """
+    BM25 search of a collection's keyword index.
+
+    Parameters:
+    collection (str): Name of the Chroma collection.
+    query (str): Query text.
+    k (int): Number of chunks to return.
+    vector_store: The collection's vector store, used to back-fill a missing index.
+
+    Returns:
+    list: (Document, bm25 score) tuples, best first.
+    """
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    if not query_terms:
+        return []
+    placeholders = ", ".join("?" * len(query_terms))
+    sqlite_conn = connect_index()
+    try:
+        if vector_store is not None:
+            ensure_indexed(sqlite_conn, collection, vector_store)
+        document_count, average_length = sqlite_conn.execute(
+            "SELECT COUNT(*), AVG(length) FROM chunks WHERE collection=?", (collection,)).fetchone()
+        if not document_count:
+            return []
+        postings = sqlite_conn.execute(
+            f"SELECT chunk_id, term, tf FROM postings WHERE collection=? AND term IN ({placeholders})",
+            (collection, *query_terms)).fetchall()
+        term_counts = {}
+        for chunk_id, term, tf in postings:
+            term_counts.setdefault(chunk_id, {})[term] = tf
+        document_frequency = Counter(term for _, term, _ in postings)
+        idfs = {term: idf(document_frequency[term], document_count) for term in query_terms}
+        chunk_ids = list(term_counts)
+        lengths = {}
+        # Chunk lengths of the candidates, in batches below SQLite's variable limit
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            rows = sqlite_conn.execute(
+                f"SELECT chunk_id, length FROM chunks WHERE collection=? AND chunk_id IN ({', '.join('?' * len(batch))})",
+                (collection, *batch)).fetchall()
+            lengths.update(rows)
+        scores = sorted(((bm25_score(query_terms, counts, lengths.get(chunk_id, 0), average_length, idfs), chunk_id)
+                         for chunk_id, counts in term_counts.items()), reverse=True)[:k]
+        results = []
+        for score, chunk_id in scores:
+            content, metadata = sqlite_conn.execute(
+                "SELECT content, metadata FROM chunks WHERE collection=? AND chunk_id=?", (collection, chunk_id)).fetchone()
+            results.append((Document(page_content=content, metadata=json.loads(metadata)), score))
+        return results
+    finally:
+        sqlite_conn.close()
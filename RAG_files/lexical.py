@@ -0,0 +1,69 @@
+import math
+import re
+from collections import Counter
+
+# BM25 parameters (Robertson/Sparck Jones defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Terms that carry no relevance signal on their own
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its me my of on or our "
+    "so that the their them there these they this to was we were what when where which who why will with "
+    "you your".split()
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+
+def tokenize(text):
+    """
+    Lower-cased word tokens without stopwords; codes like 'err-404' or 'v1.2' stay whole.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def idf(document_frequency, document_count):
+    # BM25 idf, floored at zero so terms present in most documents never count against a match
+    return max(0.0, math.log((document_count - document_frequency + 0.5) / (document_frequency + 0.5) + 1))
+
+
+def bm25_score(query_terms, term_counts, length, average_length, idfs):
+    """
+    BM25 score of one document.
+
+    Parameters:
+    query_terms (list): Distinct tokens of the query.
+    term_counts (dict): Token counts of the document.
+    length (int): Number of tokens of the document.
+    average_length (float): Average number of tokens of the documents of the corpus.
+    idfs (dict): idf of each query term.
+    """
+    score = 0.0
+    for term in query_terms:
+        tf = term_counts.get(term, 0)
+        if tf:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (average_length or 1))
+            score += idfs.get(term, 0.0) * tf * (BM25_K1 + 1) / (tf + norm)
+    return score
+
+
+def lexical_scores(query, texts):
+    """
+    BM25 of the query against each text, with idf taken over the texts, scaled to [0, 1].
+
+    The scale divides by the score of a text that contains every query term very often, so scores are
+    comparable across questions and can be used with fixed thresholds.
+    """
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    if not query_terms or not texts:
+        return [0.0] * len(texts)
+    term_counts = [Counter(tokenize(text)) for text in texts]
+    lengths = [sum(counts.values()) for counts in term_counts]
+    average_length = sum(lengths) / len(lengths)
+    idfs = {term: idf(sum(1 for counts in term_counts if term in counts), len(texts)) for term in query_terms}
+    ceiling = sum(idfs.values()) * (BM25_K1 + 1)
+    if not ceiling:
+        return [0.0] * len(texts)
+    return [bm25_score(query_terms, counts, length, average_length, idfs) / ceiling
+            for counts, length in zip(term_counts, lengths)]
@@ -0,0 +1,142 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pypdf
+from langchain_community.document_loaders.parsers.pdf import _PDF_FILTER_WITH_LOSS, _PDF_FILTER_WITHOUT_LOSS
+from langchain_core.documents import Document
+
+from util.sqlite_pool import pooled_connect
+
+logger = logging.getLogger(__name__)
+
+# Page level parallelism of PDF parsing; small PDFs are parsed inline
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 2)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "4"))
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "sqlite3_db/ocr_cache.db")
+
+executor = None
+executor_lock = threading.Lock()
+
+# Per process state of the page workers
+ocr_engine = None
+ocr_cache_ready = False
+
+
+def get_executor():
+    """
+    Return the PDF page worker pool, creating it on first use.
+    """
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS)
+    return executor
+
+
+def get_ocr_cache():
+    """
+    Check out a pooled connection to the OCR result cache, creating its table once per process.
+    """
+    global ocr_cache_ready
+    sqlite_conn = pooled_connect(OCR_CACHE_PATH)
+    if not ocr_cache_ready:
+        sqlite_conn.execute("CREATE TABLE IF NOT EXISTS ocr_results (image_hash TEXT PRIMARY KEY, text TEXT)")
+        sqlite_conn.commit()
+        ocr_cache_ready = True
+    return sqlite_conn
+
+
+def ocr_image(image):
+    """
+    Run OCR on one decoded image with this process' RapidOCR engine.
+    """
+    global ocr_engine
+    if ocr_engine is None:
+        from rapidocr_onnxruntime import RapidOCR
+        ocr_engine = RapidOCR()
+    result, _ = ocr_engine(image)
+    return "\n".join(line[1] for line in result) if result else ""
+
+
+def ocr_page_images(page):
+    """
+    OCR the images of a page, re-using cached results for images seen before.
+    """
+    if "/XObject" not in page["/Resources"].keys():
+        return ""
+    x_object = page["/Resources"]["/XObject"].get_object()
+    sqlite_conn = get_ocr_cache()
+    try:
+        return ocr_images(x_object, sqlite_conn)
+    finally:
+        sqlite_conn.close()
+
+
+def ocr_images(x_object, sqlite_conn):
+    """
+    OCR the image XObjects of a page through the OCR result cache.
+    """
+    text = ""
+    for obj in x_object:
+        if x_object[obj]["/Subtype"] != "/Image":
+            continue
+        data = x_object[obj].get_data()
+        image_hash = hashlib.sha256(data).hexdigest()
+        row = sqlite_conn.execute("SELECT text FROM ocr_results WHERE image_hash=?", (image_hash,)).fetchone()
+        if row:
+            text += row[0]
+            continue
+        # Decode the image the same way PyPDFParser does
+        if x_object[obj]["/Filter"][1:] in _PDF_FILTER_WITHOUT_LOSS:
+            height, width = x_object[obj]["/Height"], x_object[obj]["/Width"]
+            image = np.frombuffer(data, dtype=np.uint8).reshape(height, width, -1)
+        elif x_object[obj]["/Filter"][1:] in _PDF_FILTER_WITH_LOSS:
+            image = data
+        else:
+            logger.warning(f"Unknown PDF filter {x_object[obj]['/Filter']}, image skipped")
+            continue
+        image_text = ocr_image(image)
+        sqlite_conn.execute("INSERT OR REPLACE INTO ocr_results (image_hash, text) VALUES (?, ?)",
+                            (image_hash, image_text))
+        sqlite_conn.commit()
+        text += image_text
+    return text
+
+
+def parse_pdf_pages(filepath, page_numbers):
+    """
+    Worker entry point: extract the text and image OCR of the given pages.
+
+    Returns:
+    list: (page_number, text) tuples.
+    """
+    reader = pypdf.PdfReader(filepath)
+    results = []
+    for page_number in page_numbers:
+        page = reader.pages[page_number]
+        results.append((page_number, page.extract_text() + ocr_page_images(page)))
+    return results
+
+
+def load_pdf(filepath):
+    """
+    Load a PDF one document per page, like PyPDFLoader(extract_images=True), spreading pages over a process pool.
+    """
+    page_count = len(pypdf.PdfReader(filepath).pages)
+    page_numbers = list(range(page_count))
+    if page_count < PDF_PARALLEL_MIN_PAGES or PDF_PARSE_WORKERS <= 1:
+        results = parse_pdf_pages(filepath, page_numbers)
+    else:
+        # Contiguous batches keep the number of times each worker re-opens the file low
+        batch_size = -(-page_count // PDF_PARSE_WORKERS)
+        batches = [page_numbers[start:start + batch_size] for start in range(0, page_count, batch_size)]
+        futures = [get_executor().submit(parse_pdf_pages, filepath, batch) for batch in batches]
+        results = [result for future in futures for result in future.result()]
+    # Reassemble in page order
+    results.sort(key=lambda result: result[0])
+    return [Document(page_content=text, metadata={"source": filepath, "page": page_number})
+            for page_number, text in results]
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+from urllib.parse import urlsplit
+
+import bs4
+import httpx
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Limits of the shared HTTP client used for bulk fetching
+BULK_FETCH_CONCURRENCY = int(os.getenv("BULK_FETCH_CONCURRENCY", "32"))
+BULK_PER_HOST_CONCURRENCY = int(os.getenv("BULK_PER_HOST_CONCURRENCY", "4"))
+BULK_FETCH_TIMEOUT = float(os.getenv("BULK_FETCH_TIMEOUT", "30"))
+
+
+def bs4_strainer():
+    """
+    Only keep the parts of a page that hold the post title, header and content.
+    """
+    return bs4.SoupStrainer(class_=("post-title", "post-header", "post-content"))
+
+
+def parse_html(html, web_link):
+    """
+    Turn a fetched HTML page into a Document the same way WebBaseLoader does.
+    """
+    soup = bs4.BeautifulSoup(html, "html.parser", parse_only=bs4_strainer())
+    return Document(page_content=soup.get_text(), metadata={"source": web_link})
+
+
+def create_client():
+    """
+    Create the connection-pooled async HTTP client shared by one bulk fetch.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=BULK_FETCH_CONCURRENCY,
+                            max_keepalive_connections=BULK_FETCH_CONCURRENCY),
+        timeout=BULK_FETCH_TIMEOUT,
+        follow_redirects=True,
+    )
+
+
+async def fetch_page(client, web_link, limit, host_limits):
+    """
+    Fetch and parse one page, honouring the global and per-host concurrency limits.
+    """
+    host = urlsplit(web_link).netloc
+    host_limit = host_limits.setdefault(host, asyncio.Semaphore(BULK_PER_HOST_CONCURRENCY))
+    async with limit, host_limit:
+        response = await client.get(web_link)
+        response.raise_for_status()
+        return parse_html(response.text, web_link)
+
+
+async def fetch_pages(web_links, client=None):
+    """
+    Fetch many web pages concurrently over one shared client.
+
+    Parameters:
+    web_links (list): URLs to fetch.
+    client (httpx.AsyncClient): Optional client to use instead of a fresh pooled one, e.g. one pointed
+        at a local stand-in server.
+
+    Returns:
+    dict: URL -> Document, or the exception raised while fetching it.
+    """
+    owns_client = client is None
+    client = client or create_client()
+    limit = asyncio.Semaphore(BULK_FETCH_CONCURRENCY)
+    host_limits = {}
+    try:
+        results = await asyncio.gather(*(fetch_page(client, web_link, limit, host_limits) for web_link in web_links),
+                                       return_exceptions=True)
+    finally:
+        if owns_client:
+            await client.aclose()
+    for web_link, result in zip(web_links, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error fetching {web_link}: {result}\n\nError id : RAG-WFT-61")
+    return dict(zip(web_links, results))
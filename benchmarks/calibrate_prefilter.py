@@ -0,0 +1,110 @@
+"""
+Offline calibration of the SRAG relevance pre-filter against LLM grader verdicts.
+
+Reads a labelled JSONL set, one {"question", "document", "label"} object per line, where label is the
+'yes'/'no' verdict of the LLM retrieval grader. With --grade-with-llm missing labels are obtained from
+router_retrieval_grader (needs an OpenAI key). A "similarity" field, the Chroma relevance score the
+retriever saw, is used when present; otherwise it is computed from embeddings.
+
+For the configured thresholds and for a grid of alternatives it reports the share of chunks decided
+locally (LLM calls saved) and how often those local decisions agree with the labels.
+
+Usage:
+    python -m benchmarks.calibrate_prefilter labelled.jsonl --min-agreement 0.95
+"""
+import argparse
+import json
+import math
+
+import numpy as np
+from langchain_core.documents import Document
+
+from langgraph_t import prefilter
+
+
+def load_examples(path):
+    with open(path) as labelled:
+        return [json.loads(line) for line in labelled if line.strip()]
+
+
+def add_labels(examples):
+    from langgraph_t.retrieval_grader import router_retrieval_grader
+    pending = [example for example in examples if "label" not in example]
+    scores = router_retrieval_grader().batch(
+        [{"question": example["question"], "document": example["document"]} for example in pending],
+        config={"max_concurrency": 8},
+    )
+    for example, score in zip(pending, scores):
+        example["label"] = score.binary_score.strip().lower()
+
+
+def add_similarities(examples):
+    from util.vector_store_registry import get_embedding_function
+    pending = [example for example in examples if "similarity" not in example]
+    if not pending:
+        return
+    embeddings = get_embedding_function()
+    questions = np.array(embeddings.embed_documents([example["question"] for example in pending]))
+    documents = np.array(embeddings.embed_documents([example["document"] for example in pending]))
+    for example, question, document in zip(pending, questions, documents):
+        # Chroma ranks by squared L2 distance and LangChain maps it to 1 - distance / sqrt(2)
+        example["similarity"] = 1.0 - float(np.sum((question - document) ** 2)) / math.sqrt(2)
+
+
+def score_examples(examples, lexical_weight):
+    scores = []
+    for example in examples:
+        document = Document(page_content=example["document"],
+                            metadata={prefilter.SIMILARITY_KEY: example["similarity"]})
+        scores.extend(prefilter.combined_scores(example["question"], [document], lexical_weight))
+    return scores
+
+
+def evaluate(scores, labels, accept, reject):
+    decided = agreed = 0
+    for score, label in zip(scores, labels):
+        verdict = prefilter.band(score, accept, reject)
+        if verdict is not None:
+            decided += 1
+            agreed += verdict == label
+    return decided / len(labels), (agreed / decided if decided else 1.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="labelled JSONL set")
+    parser.add_argument("--grade-with-llm", action="store_true", help="label unlabelled pairs with the LLM grader")
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    parser.add_argument("--lexical-weight", type=float, default=prefilter.PREFILTER_LEXICAL_WEIGHT)
+    args = parser.parse_args()
+
+    examples = load_examples(args.path)
+    if args.grade_with_llm:
+        add_labels(examples)
+    examples = [example for example in examples if example.get("label") in ("yes", "no")]
+    if not examples:
+        parser.error("no labelled examples, pass --grade-with-llm to label them")
+    add_similarities(examples)
+    scores = score_examples(examples, args.lexical_weight)
+    labels = [example["label"] for example in examples]
+
+    print(f"{len(examples)} labelled pairs, {labels.count('yes')} relevant, lexical weight {args.lexical_weight}")
+    coverage, agreement = evaluate(scores, labels, prefilter.PREFILTER_ACCEPT, prefilter.PREFILTER_REJECT)
+    print(f"configured accept={prefilter.PREFILTER_ACCEPT} reject={prefilter.PREFILTER_REJECT}: "
+          f"{coverage:.1%} decided locally, {agreement:.1%} agreement")
+
+    # Widest bands (most LLM calls saved) that still agree with the grader often enough
+    candidates = []
+    for accept in np.arange(0.5, 1.001, 0.05):
+        for reject in np.arange(0.0, accept, 0.05):
+            coverage, agreement = evaluate(scores, labels, accept, reject)
+            if agreement >= args.min_agreement:
+                candidates.append((coverage, agreement, round(accept, 2), round(reject, 2)))
+    candidates.sort(reverse=True)
+    print(f"\n{'accept':>8}{'reject':>8}{'decided':>10}{'agreement':>11}")
+    for coverage, agreement, accept, reject in candidates[:10]:
+        print(f"{accept:>8}{reject:>8}{coverage:>10.1%}{agreement:>11.1%}")
+
+
+if __name__ == "__main__":
+    main()
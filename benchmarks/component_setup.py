@@ -0,0 +1,58 @@
+"""
+Microbenchmark of the per-request setup cost removed by building chains and the SRAG graph once.
+
+For every factory it times a fresh build (what each request used to pay: new ChatOpenAI client, prompt
+template and structured-output wrapper, or a full graph compile) against the shared instance returned
+by the cached factory. No LLM is called.
+
+Usage:
+    python -m benchmarks.component_setup --repeat 50
+"""
+import argparse
+import os
+import time
+
+# Building a ChatOpenAI client needs a key, but no request is ever sent
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_openai import ChatOpenAI
+
+from langgraph_t.generate import router_generate
+from langgraph_t.grade_answer import router_grade_answer
+from langgraph_t.graph_route import create_graph
+from langgraph_t.hallucination import router_hallucination
+from langgraph_t.main import get_graph
+from langgraph_t.question_rewriter import router_question_rewriter
+from langgraph_t.retrieval_grader import router_retrieval_grader
+from util.llm_clients import get_chat_model
+
+
+def average_ms(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    components = {
+        "ChatOpenAI client": (lambda: ChatOpenAI(model="gpt-3.5-turbo", temperature=0),
+                              lambda: get_chat_model("gpt-3.5-turbo", temperature=0)),
+        "router_generate": (router_generate.__wrapped__, router_generate),
+        "router_grade_answer": (router_grade_answer.__wrapped__, router_grade_answer),
+        "router_hallucination": (router_hallucination.__wrapped__, router_hallucination),
+        "router_question_rewriter": (router_question_rewriter.__wrapped__, router_question_rewriter),
+        "router_retrieval_grader": (router_retrieval_grader.__wrapped__, router_retrieval_grader),
+        "compiled graph": (create_graph, get_graph),
+    }
+    print(f"{'component':<26}{'fresh build (ms)':>18}{'shared (ms)':>14}")
+    for name, (fresh, shared) in components.items():
+        print(f"{name:<26}{average_ms(fresh, args.repeat):>18.3f}{average_ms(shared, args.repeat):>14.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Load benchmark of the micro-batching gateway against the local OpenAI stub server.
+
+Fires --requests concurrent SRAG-like requests, each embedding its question and grading --documents chunks,
+first with direct calls (one upstream request per query and per document) and then through the gateway.
+Reports the wall time, the requests the stub received and the gateway's batch-size and queue-wait histograms.
+No API key or network access is used.
+
+Usage:
+    python -m benchmarks.gateway_load --requests 50 --documents 4 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from langchain_core.documents import Document
+
+from benchmarks.stub_openai_server import StubHandler, start_stub_server
+from langgraph_t import graph_route
+from util.executor import run_blocking
+from util.llm_gateway import BatchedEmbeddings, gateway_stats
+
+
+async def one_request(embeddings, i, documents):
+    question = f"question {i} about linear algebra"
+    await run_blocking(embeddings.embed_query, question)
+    await graph_route.grade_pending(question, documents)
+
+
+async def run_load(embeddings, requests, documents):
+    await asyncio.gather(*(one_request(embeddings, i, documents) for i in range(requests)))
+
+
+def timed(label, embeddings, args, documents):
+    StubHandler.requests.clear()
+    start = time.perf_counter()
+    asyncio.run(run_load(embeddings, args.requests, documents))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed:.3f}s  upstream requests: {dict(StubHandler.requests)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stub request")
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    from langchain_openai import OpenAIEmbeddings
+    # Send the texts as they are; the stub does not need them tokenized
+    embeddings = OpenAIEmbeddings(check_embedding_ctx_length=False)
+    documents = [Document(page_content=f"document {i}") for i in range(args.documents)]
+
+    print(f"{args.requests} requests, {args.documents} documents each, {args.latency}s per upstream request")
+    graph_route.GRADER_MODE = "concurrent"
+    timed("direct", embeddings, args, documents)
+    graph_route.GRADER_MODE = "gateway"
+    timed("gateway", BatchedEmbeddings(embeddings), args, documents)
+    print(json.dumps(gateway_stats(), indent=2))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
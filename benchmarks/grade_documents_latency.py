@@ -0,0 +1,76 @@
+"""
+Latency benchmark of SRAG document grading against a stub LLM.
+
+Compares the former one-call-at-a-time loop with the concurrent and batched grading modes of
+langgraph_t.graph_route.grade_relevance. The stub sleeps for a fixed latency per call, so no API key
+or network access is used.
+
+Usage:
+    python -m benchmarks.grade_documents_latency --documents 4 --latency 0.5
+"""
+import argparse
+import asyncio
+import inspect
+import time
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from langgraph_t import graph_route, prefilter
+from langgraph_t.retrieval_grader import GradeDocuments, GradeDocumentsBatch
+from util.verdict_cache import get_verdict_cache
+
+
+def stub_grader(latency):
+    def grade(inputs):
+        time.sleep(latency)
+        return GradeDocuments(binary_score="yes")
+    return lambda: RunnableLambda(grade)
+
+
+def stub_batch_grader(latency, count):
+    def grade(inputs):
+        time.sleep(latency)
+        return GradeDocumentsBatch(binary_scores=["yes"] * count)
+    return lambda: RunnableLambda(grade)
+
+
+def sequential(question, documents):
+    # Grading as it was done before: a new chain and one round trip per document
+    return [graph_route.router_retrieval_grader().invoke({"question": question, "document": d.page_content})
+            .binary_score for d in documents]
+
+
+def timed(label, function, *args):
+    # Start every mode from an empty verdict cache, otherwise only the first one calls the grader
+    get_verdict_cache().clear()
+    start = time.perf_counter()
+    result = function(*args)
+    if inspect.iscoroutine(result):
+        asyncio.run(result)
+    print(f"{label:<12} {time.perf_counter() - start:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per stub LLM call")
+    args = parser.parse_args()
+
+    question = "what is the grade for linear algebra?"
+    documents = [Document(page_content=f"document {i}") for i in range(args.documents)]
+    # The stub documents have no similarity score; send all of them to the (stub) grader
+    prefilter.PREFILTER_ENABLED = False
+    graph_route.router_retrieval_grader = stub_grader(args.latency)
+    graph_route.router_batch_retrieval_grader = stub_batch_grader(args.latency, args.documents)
+
+    print(f"{args.documents} documents, {args.latency}s per LLM call")
+    timed("sequential", sequential, question, documents)
+    graph_route.GRADER_MODE = "concurrent"
+    timed("concurrent", graph_route.grade_relevance, question, documents)
+    graph_route.GRADER_MODE = "batched"
+    timed("batched", graph_route.grade_relevance, question, documents)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Latency benchmark of SRAG generation grading against stub LLMs.
+
+Grades the same answers in the sequential, concurrent and combined generation grader modes of
+langgraph_t.graph_route and reports the LLM calls and the time spent per answered question. Answers are a mix
+of grounded and useful ones, ungrounded ones and unhelpful ones, as set by --ungrounded and --not-useful. The
+stubs sleep for a fixed latency per call, so no API key or network access is used.
+
+Usage:
+    python -m benchmarks.grade_generation_latency --questions 20 --latency 0.5 --ungrounded 0.2 --not-useful 0.1
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from langgraph_t import graph_route
+from langgraph_t.generation_grader import GradeGeneration
+from langgraph_t.grade_answer import GradeAnswer
+from langgraph_t.hallucination import GradeHallucinations
+from util.verdict_cache import get_verdict_cache
+
+calls = Counter()
+
+
+def verdict(flag):
+    return "yes" if flag else "no"
+
+
+def stub_chain(name, latency, grade):
+    async def run(inputs):
+        calls[name] += 1
+        await asyncio.sleep(latency)
+        return grade(inputs["generation"])
+    return lambda: RunnableLambda(run)
+
+
+def answers(count, ungrounded, not_useful):
+    # Generations spell out their own ground truth, so the stub graders can read it back
+    truths = {}
+    for i in range(count):
+        position = i / count
+        grounded = position >= ungrounded
+        useful = not (ungrounded <= position < ungrounded + not_useful)
+        truths[f"answer {i}"] = (grounded, useful)
+    return truths
+
+
+async def grade_all(mode, truths):
+    config = {"configurable": {"generation_grader": mode}}
+    documents = [Document(page_content=f"document {i}") for i in range(4)]
+    decisions = Counter()
+    for generation in truths:
+        state = {"question": f"question about {generation}", "documents": documents, "generation": generation,
+                 "generations": 0}
+        graded = await graph_route.grade_generation_v_documents_and_question(state, config)
+        decisions[graded["verdict"]] += 1
+    return decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per stub LLM call")
+    parser.add_argument("--ungrounded", type=float, default=0.2, help="share of ungrounded answers")
+    parser.add_argument("--not-useful", type=float, default=0.1, help="share of grounded but unhelpful answers")
+    args = parser.parse_args()
+
+    truths = answers(args.questions, args.ungrounded, args.not_useful)
+    graph_route.router_hallucination = stub_chain(
+        "hallucination", args.latency, lambda g: GradeHallucinations(binary_score=verdict(truths[g][0])))
+    graph_route.router_grade_answer = stub_chain(
+        "answer", args.latency, lambda g: GradeAnswer(binary_score=verdict(truths[g][1])))
+    graph_route.router_generation_grader = stub_chain(
+        "generation", args.latency,
+        lambda g: GradeGeneration(grounded=verdict(truths[g][0]), useful=verdict(truths[g][1])))
+
+    print(f"{args.questions} answers, {args.latency}s per LLM call")
+    print(f"{'mode':<12} {'calls/q':>8} {'latency/q':>10}  decisions")
+    for mode in ("sequential", "concurrent", "combined"):
+        # Start every mode from an empty verdict cache, otherwise only the first one calls the graders
+        get_verdict_cache().clear()
+        calls.clear()
+        start = time.perf_counter()
+        decisions = asyncio.run(grade_all(mode, truths))
+        elapsed = time.perf_counter() - start
+        print(f"{mode:<12} {sum(calls.values()) / args.questions:>8.2f} {elapsed / args.questions:>9.3f}s  "
+              f"{dict(decisions)}")
+
+
+if __name__ == "__main__":
+    main()
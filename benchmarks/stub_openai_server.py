@@ -0,0 +1,110 @@
+"""
+Local OpenAI-compatible stub server for load tests without an API key.
+
+Serves /v1/embeddings (deterministic vectors) and /v1/chat/completions (a tool call answering every
+structured-output grader with 'yes', one per numbered "Pair N:" / "Document N:" item for list fields). Every
+request sleeps for a fixed latency and is counted per endpoint. Streaming completions are not supported.
+
+Usage:
+    python -m benchmarks.stub_openai_server --port 8081 --latency 0.2
+    set OPENAI_BASE_URL=http://127.0.0.1:8081/v1
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NUMBERED_ITEM = re.compile(r"^\s*(?:Pair|Document) \d+:", re.MULTILINE)
+
+
+def stub_vector(item, dimensions):
+    digest = hashlib.sha256(json.dumps(item).encode("utf-8")).digest()
+    return [digest[i % len(digest)] / 255 for i in range(dimensions)]
+
+
+def stub_arguments(parameters, prompt):
+    items = max(1, len(NUMBERED_ITEM.findall(prompt)))
+    arguments = {}
+    for name, schema in parameters.get("properties", {}).items():
+        arguments[name] = ["yes"] * items if schema.get("type") == "array" else "yes"
+    return arguments
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    dimensions = 16
+    requests = Counter()
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        endpoint = self.path.rsplit("/", 1)[-1]
+        with self.lock:
+            self.requests[endpoint] += 1
+        time.sleep(self.latency)
+        if endpoint == "embeddings":
+            inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            self.reply({"object": "list", "model": request["model"],
+                        "data": [{"object": "embedding", "index": i, "embedding": stub_vector(item, self.dimensions)}
+                                 for i, item in enumerate(inputs)],
+                        "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+        elif endpoint == "completions":
+            prompt = "\n".join(str(message.get("content") or "") for message in request["messages"])
+            message = {"role": "assistant", "content": "stub answer"}
+            finish_reason = "stop"
+            if request.get("tools"):
+                function = request["tools"][0]["function"]
+                message = {"role": "assistant", "content": None, "tool_calls": [{
+                    "id": "call_0", "type": "function",
+                    "function": {"name": function["name"],
+                                 "arguments": json.dumps(stub_arguments(function.get("parameters", {}), prompt))},
+                }]}
+                finish_reason = "tool_calls"
+            self.reply({"id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                        "model": request["model"],
+                        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}})
+        else:
+            self.send_error(404)
+
+
+def start_stub_server(port=0, latency=0.0, dimensions=16):
+    """
+    Start the stub in a background thread; returns the server (its address is server.server_address).
+    """
+    StubHandler.latency = latency
+    StubHandler.dimensions = dimensions
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stub request")
+    parser.add_argument("--dimensions", type=int, default=16)
+    args = parser.parse_args()
+    StubHandler.latency = args.latency
+    StubHandler.dimensions = args.dimensions
+    print(f"OpenAI stub listening on http://127.0.0.1:{args.port}/v1")
+    ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
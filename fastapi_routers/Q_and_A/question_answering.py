@@ -1,5 +1,9 @@
-from fastapi import APIRouter
-from RAG_files.RAG_file_retriever import generate_answer_api
+from typing import Annotated
+
+from fastapi import APIRouter, Query
+from RAG_files.RAG_file_retriever import generate_answer_api, stream_answer_api, generate_multi_answer_api
+from RAG_files.hybrid_retriever import RetrieverMode
+from util.streaming import StreamMode, stream_response
 import logging
 
 # Configure logging
@@ -10,10 +14,26 @@ router = APIRouter()
 
 
 @router.get('/rag/generate-answer/{ref_id}')
-async def generate(ref_id, question):
+async def generate(ref_id, question, stream: StreamMode | None = None, retriever_mode: RetrieverMode | None = None,
+                   session_id: str | None = None):
+    if stream:
+        # Emit the answer tokens as they arrive from the LLM
+        return stream_response(stream_answer_api(ref_id, question, retriever_mode, session_id), stream)
     try:
-        result = generate_answer_api(ref_id, question)  # Generate the answer using the RAG model
+        result = await generate_answer_api(ref_id, question, retriever_mode, session_id)  # Generate the answer using the RAG model
         return result
     except Exception as e:
         logger.error(f"Error generating answer: {e}\n\nError id : ETF-GAI-1")
         return {"result": "There was an error generating the answer", "error_id": "ETF-GAI-1"}
+
+
+@router.get('/rag/generate-answer-multi/')
+async def generate_multi(question, ref_ids: Annotated[list[str] | None, Query()] = None, title: str | None = None,
+                         retriever_mode: RetrieverMode | None = None):
+    try:
+        # Search every matching document concurrently and answer once from the merged hits
+        result = await generate_multi_answer_api(question, ref_ids, title, retriever_mode)
+        return result
+    except Exception as e:
+        logger.error(f"Error generating answer: {e}\n\nError id : ETF-GAI-2")
+        return {"result": "There was an error generating the answer", "error_id": "ETF-GAI-2"}
@@ -1,5 +1,8 @@
 from fastapi import APIRouter
-from langgraph_t.main import generate_rag_answer
+from langgraph_t.generation_grader import GenerationGraderMode
+from langgraph_t.main import generate_rag_answer, stream_rag_answer
+from RAG_files.hybrid_retriever import RetrieverMode
+from util.streaming import StreamMode, stream_response
 import logging
 
 # Configure logging
@@ -10,10 +13,23 @@ router = APIRouter()
 
 
 @router.get('/srag/generate/')
-async def generate(question):
+async def generate(question, stream: StreamMode | None = None, retriever_mode: RetrieverMode | None = None,
+                   generation_grader: GenerationGraderMode | None = None):
+    if stream:
+        # Emit node progress and answer tokens as they happen instead of one final JSON body
+        return stream_response(srag_events(question, retriever_mode, generation_grader), stream)
     try:
-        result = generate_rag_answer(question)
+        result = await generate_rag_answer(question, retriever_mode, generation_grader)
         return result
     except Exception as e:
         logger.error(f"Error generating answer: {e}\n\nError id : ETF-RAG-482")
         return {"result": "There was an error generating the answer", "error_id": "ETF-GAI-482"}
+
+
+async def srag_events(question, retriever_mode=None, generation_grader=None):
+    try:
+        async for event in stream_rag_answer(question, retriever_mode, generation_grader):
+            yield event
+    except Exception as e:
+        logger.error(f"Error streaming answer: {e}\n\nError id : ETF-RAG-483")
+        yield "error", {"result": "There was an error generating the answer", "error_id": "ETF-RAG-483"}
@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from util.answer_cache import get_answer_cache
+from util.embedding_cache import get_embedding_cache
+from util.executor import run_blocking
+from util.verdict_cache import get_verdict_cache
+from langgraph_t.search_provider import get_search_cache
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get('/rag/cache/stats')
+async def cache_stats():
+    try:
+        # Hit rates are counted per worker process since its start
+        answers = await run_blocking(get_answer_cache().stats)
+        embeddings = await run_blocking(get_embedding_cache().stats)
+        return {"answer_cache": answers, "embedding_cache": embeddings, "verdict_cache": get_verdict_cache().stats(),
+                "web_search_cache": get_search_cache().stats()}
+    except Exception as e:
+        logger.error(f"Error retrieving cache statistics: {e}\n\nError id : ETF-CCH-3")
+        return {"result": "There was an error retrieving the cache statistics", "error_id": "ETF-CCH-3"}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 from util.db_manager import connect_db, delete_entry_from_db, reset_db
+from util.executor import run_blocking
 import logging
 
 # Configure logging
@@ -12,8 +13,8 @@ router = APIRouter()
 async def delete_entry(index):
     sqlite_conn = None
     try:
-        sqlite_conn = connect_db()  # Connect to the database
-        result = delete_entry_from_db(index, sqlite_conn)  # Delete the entry from the database
+        sqlite_conn = await run_blocking(connect_db)  # Connect to the database
+        result = await run_blocking(delete_entry_from_db, index, sqlite_conn)  # Delete the entry from the database
         return result
     except Exception as e:
         logger.error(f"Error deleting entry: {e}\n\nError id : ETF-DBE-10")
@@ -27,8 +28,8 @@ async def delete_entry(index):
 async def resetdb():
     sqlite_conn = None
     try:
-        sqlite_conn = connect_db()  # Connect to the database
-        result = reset_db(sqlite_conn)  # Reset the database
+        sqlite_conn = await run_blocking(connect_db)  # Connect to the database
+        result = await run_blocking(reset_db, sqlite_conn)  # Reset the database
         return result
     except Exception as e:
         logger.error(f"Error resetting database: {e}\n\nError id : ETF-DBE-8")
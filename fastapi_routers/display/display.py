@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from util.db_manager import connect_db, display_all_files_with_index
 from RAG_files.RAG_file_retriever import retrieve_file_info
+from util.executor import run_blocking
 import logging
 
 # Configure logging
@@ -14,8 +15,8 @@ router = APIRouter()
 async def get_all_files():
     sqlite_conn = None
     try:
-        sqlite_conn = connect_db()  # Connect to the database
-        result = display_all_files_with_index(sqlite_conn)  # Retrieve and display all files and links
+        sqlite_conn = await run_blocking(connect_db)  # Connect to the database
+        result = await run_blocking(display_all_files_with_index, sqlite_conn)  # Retrieve and display all files and links
         return result
     except Exception as e:
         logger.error(f"Error displaying all files: {e}\n\nError id : ETF-DPY-2")
@@ -29,8 +30,8 @@ async def get_all_files():
 async def retrieve_file(index):
     sqlite_conn = None
     try:
-        sqlite_conn = connect_db()  # Connect to the database
-        result = retrieve_file_info(index, sqlite_conn)  # Retrieve the file/link information
+        sqlite_conn = await run_blocking(connect_db)  # Connect to the database
+        result = await run_blocking(retrieve_file_info, index, sqlite_conn)  # Retrieve the file/link information
         return result
     except Exception as e:
         logger.error(f"Error retrieving file: {e}\n\nError id : ETF-DPY-5")
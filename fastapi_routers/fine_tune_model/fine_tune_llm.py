@@ -3,8 +3,10 @@ from typing import Annotated
 from fastapi import APIRouter, UploadFile, Form, File
 import logging
 from fine_tuning.file_tune import fine_tune_create, fine_tune_train, fine_tune_retrieve_status, \
-    generate_answer_from_model
+    generate_answer_from_model, stream_answer_from_model
 from util.db_manager import connect_db
+from util.executor import run_blocking
+from util.streaming import StreamMode, stream_response
 
 router = APIRouter()
 
@@ -17,8 +19,8 @@ logger = logging.getLogger(__name__)
 async def upload_doc_ft(title: Annotated[str, Form()], file: UploadFile = File(...)):
     sqlite_conn = None
     try:
-        sqlite_conn = connect_db()
-        result = fine_tune_create(sqlite_conn, file, title)
+        sqlite_conn = await run_blocking(connect_db)
+        result = await run_blocking(fine_tune_create, sqlite_conn, file, title)
         return result
     except Exception as e:
         logger.error(f"Error uploading file: {e}\n\nError id : ETF-FTL-43")
@@ -32,8 +34,8 @@ async def upload_doc_ft(title: Annotated[str, Form()], file: UploadFile = File(.
 async def train(file_id):
     sqlite_conn = None
     try:
-        sqlite_conn = connect_db()
-        return fine_tune_train(file_id)
+        sqlite_conn = await run_blocking(connect_db)
+        return await run_blocking(fine_tune_train, file_id)
     except Exception as e:
         logger.error(f"Error uploading file: {e}\n\nError id : ETF-FTL-96")
         return {"result": "There was an error", "error_id": "ETF-FTL-34"}
@@ -46,8 +48,8 @@ async def train(file_id):
 async def retrieve(file_id):
     sqlite_conn = None
     try:
-        sqlite_conn = connect_db()
-        return fine_tune_retrieve_status(file_id)
+        sqlite_conn = await run_blocking(connect_db)
+        return await run_blocking(fine_tune_retrieve_status, file_id)
     except Exception as e:
         logger.error(f"Error retrieving the status of file: {e}\n\nError id : ETF-FTL-96")
         return {"result": "There was an error", "error_id": "ETF-FTL-96"}
@@ -57,9 +59,12 @@ async def retrieve(file_id):
 
 
 @router.get('/fine-tune/generate-answer/{model}')
-async def generate(model, question):
+async def generate(model, question, stream: StreamMode | None = None):
+    if stream:
+        # Emit the answer tokens as they arrive from the model
+        return stream_response(stream_answer_from_model(model, question), stream)
     try:
-        result = generate_answer_from_model(model, question)
+        result = await generate_answer_from_model(model, question)
         return result
     except Exception as e:
         logger.error(f"Error generating answer : {e}\n\nError id : ETF-FTL-193")
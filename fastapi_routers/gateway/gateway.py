@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+from util.llm_gateway import gateway_stats
+from util.llm_scheduler import scheduler_stats
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get('/rag/gateway/stats')
+async def batching_stats():
+    try:
+        # Histograms are counted per worker process since its start; a kind of call shows up once it is used
+        return gateway_stats()
+    except Exception as e:
+        logger.error(f"Error retrieving gateway statistics: {e}\n\nError id : ETF-GTW-3")
+        return {"result": "There was an error retrieving the gateway statistics", "error_id": "ETF-GTW-3"}
+
+
+@router.get('/rag/llm/rate-limits')
+async def rate_limit_stats():
+    try:
+        # Waits for the per-model rate limits and retries of this worker process since its start
+        return scheduler_stats()
+    except Exception as e:
+        logger.error(f"Error retrieving rate limit statistics: {e}\n\nError id : ETF-GTW-8")
+        return {"result": "There was an error retrieving the rate limit statistics", "error_id": "ETF-GTW-8"}
@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+from util.db_manager import connect_db
+from util.executor import run_blocking
+from util.job_queue import get_job
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get('/rag/jobs/{job_id}')
+async def job_status(job_id):
+    sqlite_conn = None
+    try:
+        sqlite_conn = await run_blocking(connect_db)  # Connect to the database
+        job = await run_blocking(get_job, sqlite_conn, job_id)  # Retrieve the stage and progress of the ingestion job
+        if job is None:
+            return {"result": f"No job found with id: {job_id}", "error_id": "ETF-JOB-4"}
+        return job
+    except Exception as e:
+        logger.error(f"Error retrieving job status: {e}\n\nError id : ETF-JOB-9")
+        return {"result": "There was an error retrieving the job status", "error_id": "ETF-JOB-9"}
+    finally:
+        if sqlite_conn:
+            sqlite_conn.close()  # Close the database connection
@@ -1,10 +1,12 @@
+import json
 import logging
 from typing import Annotated
 
 from fastapi import APIRouter, File, UploadFile, Form
 from pydantic import BaseModel
-from util.db_manager import create_db, connect_db
-from RAG_files.RAG_input_and_storage import upload_docs_api, store_links_api
+from util.db_manager import connect_db
+from util.executor import run_blocking
+from RAG_files.RAG_input_and_storage import queue_file_upload, queue_link_upload, queue_bulk_upload
 from fine_tuning.file_tune import fine_tune_create
 
 # Configure logging
@@ -23,9 +25,8 @@ class Data(BaseModel):
 async def upload_data(data: Data):
     sqlite_conn = None
     try:
-        sqlite_conn = connect_db()  # Connect to the database
-        create_db(sqlite_conn)  # Ensure the database table exists
-        result = store_links_api(data.title, data.data, sqlite_conn)  # Store the link in the database
+        sqlite_conn = await run_blocking(connect_db)  # Connect to the database
+        result = await run_blocking(queue_link_upload, sqlite_conn, data.title, data.data)  # Queue the link for ingestion
         return result
     except Exception as e:
         logger.error(f"Error uploading data: {e}\n\nError id : ETF-UID-13")
@@ -39,8 +40,8 @@ async def upload_data(data: Data):
 async def upload_doc(title: Annotated[str, Form()], file: UploadFile = File(...)):
     sqlite_conn = None
     try:
-        sqlite_conn = connect_db()  # Connect to the database
-        result = upload_docs_api(sqlite_conn, file, title)  # Store the file in the database
+        sqlite_conn = await run_blocking(connect_db)  # Connect to the database
+        result = await run_blocking(queue_file_upload, sqlite_conn, file, title)  # Save the file and queue it for ingestion
         return result
     except Exception as e:
         logger.error(f"Error uploading file: {e}\n\nError id : ETF-UID-12")
@@ -50,3 +51,19 @@ async def upload_doc(title: Annotated[str, Form()], file: UploadFile = File(...)
             sqlite_conn.close()  # Close the database connection
 
 
+@router.post('/rag/upload/bulk/')
+async def upload_bulk(links: Annotated[str, Form()] = "[]", file_titles: Annotated[list[str] | None, Form()] = None,
+                      files: Annotated[list[UploadFile] | None, File()] = None):
+    sqlite_conn = None
+    try:
+        # links is a JSON list of {"title": ..., "data": ...} objects, validated like the single link endpoint
+        link_items = [Data(**item).model_dump() for item in json.loads(links)]
+        sqlite_conn = await run_blocking(connect_db)  # Connect to the database
+        result = await run_blocking(queue_bulk_upload, sqlite_conn, link_items, files or [], file_titles)  # Queue everything at once
+        return result
+    except Exception as e:
+        logger.error(f"Error uploading bulk data: {e}\n\nError id : ETF-UID-14")
+        return {"result": "There was an error uploading the data", "error_id": "ETF-UID-14"}
+    finally:
+        if sqlite_conn:
+            sqlite_conn.close()  # Close the database connection
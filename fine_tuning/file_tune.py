@@ -1,10 +1,15 @@
 import shutil
 import os
+from functools import lru_cache
+
 import openai
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from RAG_files.RAG_file_retriever import retrieve_file_info, logger
+from util.llm_clients import get_chat_model, get_http_client
+
+# File uploads and fine-tuning jobs use the process-wide connection pool as well
+openai.http_client = get_http_client()
 
 
 def fine_tune_create(sqlite_conn, file, title):
@@ -75,29 +80,54 @@ def fine_tune_retrieve_status(file_id):
         return {"result": "There was an error retrieving the job status", "error_id": "ETF-FTR-57"}
 
 
-def generate_answer_from_model(model_name, question):
+@lru_cache(maxsize=32)
+def get_fine_tuned_chain(model_name):
     """
-    Generate an answer to a question using a fine-tuned model.
+    Build (once per model) the answer chain of a fine-tuned model.
     """
-    try:
-        parser = StrOutputParser()
-        model = ChatOpenAI(model=model_name)
+    parser = StrOutputParser()
+    model = get_chat_model(model_name)
+
+    system_template = (
+        "You are an assistant for question-answering tasks. "
+        "Use the following pieces of retrieved context to answer and analyse "
+        "the question. If you don't know the answer to the question, say that you "
+        "don't know. Use five sentences maximum and keep the "
+        "answer concise."
+    )
+    prompt_template = ChatPromptTemplate.from_messages(
+        [("system", system_template), ("user", "{text}")]
+    )
 
-        system_template = (
-            "You are an assistant for question-answering tasks. "
-            "Use the following pieces of retrieved context to answer and analyse "
-            "the question. If you don't know the answer to the question, say that you "
-            "don't know. Use five sentences maximum and keep the "
-            "answer concise."
-        )
-        prompt_template = ChatPromptTemplate.from_messages(
-            [("system", system_template), ("user", "{text}")]
-        )
+    return prompt_template | model | parser
 
-        chain = prompt_template | model | parser
 
-        return {"user_input": question, "genai_response": chain.invoke(question)}
+async def generate_answer_from_model(model_name, question):
+    """
+    Generate an answer to a question using a fine-tuned model.
+    """
+    try:
+        chain = get_fine_tuned_chain(model_name)
+
+        return {"user_input": question, "genai_response": await chain.ainvoke(question)}
 
     except Exception as e:
         logger.error(f"generate_answer_from_model: Error generating answer: {e}\n\nError id : ETF-GAM-58")
         return {"result": "There was an error generating the answer", "error_id": "ETF-GAM-58"}
+
+
+async def stream_answer_from_model(model_name, question):
+    """
+    Stream the answer of a fine-tuned model as ("token", ...) events, then a final ("answer", ...) event.
+    """
+    try:
+        chain = get_fine_tuned_chain(model_name)
+        answer = ""
+        async for token in chain.astream(question):
+            answer += token
+            yield "token", {"token": token}
+        yield "answer", {"user_input": question, "genai_response": answer}
+
+    except Exception as e:
+        logger.error(f"stream_answer_from_model: Error streaming answer: {e}\n\nError id : ETF-GAM-59")
+        yield "error", {"result": "There was an error generating the answer", "error_id": "ETF-GAM-59"}
@@ -0,0 +1,113 @@
+### Request Budget
+
+# Importing necessary modules and classes
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from util.tokens import count_tokens
+
+# Per-request limits of the SRAG loop; once one is reached the graph returns the best answer so far
+MAX_LLM_CALLS = int(os.getenv("SRAG_MAX_LLM_CALLS", "20"))
+MAX_SECONDS = float(os.getenv("SRAG_MAX_SECONDS", "60"))
+MAX_TOKENS = int(os.getenv("SRAG_MAX_TOKENS", "30000"))
+# Query rewrites before falling back to web search, and answers generated before giving up on the graders
+MAX_REWRITES = int(os.getenv("SRAG_MAX_REWRITES", "2"))
+MAX_GENERATIONS = int(os.getenv("SRAG_MAX_GENERATIONS", "3"))
+
+
+class RequestBudget(BaseCallbackHandler):
+    """
+    Callback handler counting the LLM calls, tokens and wall-clock time of one SRAG request.
+
+    It is passed in the run config, so every chain called by the graph nodes reports to it.
+    """
+
+    # Counting is cheap, so run in the event loop rather than in an executor thread
+    run_inline = True
+
+    def __init__(self, max_llm_calls=MAX_LLM_CALLS, max_seconds=MAX_SECONDS, max_tokens=MAX_TOKENS):
+        self.max_llm_calls = max_llm_calls
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.llm_calls = 0
+        self.tokens = 0
+        self.started = time.monotonic()
+        self.prompt_tokens = {}
+        self.lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        # Estimated prompt size, used when the provider reports no usage (streamed calls)
+        prompt_tokens = sum(count_tokens(str(message.content)) for batch in messages for message in batch)
+        with self.lock:
+            self.llm_calls += 1
+            self.prompt_tokens[run_id] = prompt_tokens
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        with self.lock:
+            self.llm_calls += 1
+            self.prompt_tokens[run_id] = sum(count_tokens(prompt) for prompt in prompts)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        tokens = usage.get("total_tokens")
+        if not tokens:
+            completion = "".join(generation.text for batch in response.generations for generation in batch)
+            tokens = self.prompt_tokens.get(run_id, 0) + count_tokens(completion)
+        with self.lock:
+            self.prompt_tokens.pop(run_id, None)
+            self.tokens += tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self.lock:
+            self.prompt_tokens.pop(run_id, None)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def exhausted(self):
+        """
+        Return the name of the first limit reached, or None while the request is within budget.
+        """
+        if self.llm_calls >= self.max_llm_calls:
+            return "llm_calls"
+        if self.tokens >= self.max_tokens:
+            return "tokens"
+        if self.elapsed() >= self.max_seconds:
+            return "time"
+        return None
+
+    def usage(self):
+        return {"llm_calls": self.llm_calls, "tokens": self.tokens, "seconds": round(self.elapsed(), 3),
+                "exhausted": self.exhausted()}
+
+
+def get_budget(config):
+    """
+    Return the budget of the run, or None when the graph is run without one.
+    """
+    return ((config or {}).get("configurable") or {}).get("budget")
+
+
+def get_retriever_mode(config):
+    """
+    Return the retriever mode requested for the run, or None for the default.
+    """
+    return ((config or {}).get("configurable") or {}).get("retriever_mode")
+
+
+def get_generation_grader_mode(config):
+    """
+    Return the generation grader mode requested for the run, or None for the default.
+    """
+    return ((config or {}).get("configurable") or {}).get("generation_grader")
+
+
+def budget_config(budget, retriever_mode=None, generation_grader=None):
+    """
+    Run config that reports the LLM calls of every node to the budget and carries the request options.
+    """
+    return {"callbacks": [budget], "configurable": {"budget": budget, "retriever_mode": retriever_mode,
+                                                    "generation_grader": generation_grader}}
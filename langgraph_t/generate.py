@@ -1,14 +1,23 @@
 ### Generate
 # Importing necessary modules and classes from langchain and other packages
+from functools import lru_cache
+
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from util.llm_clients import get_chat_model
 
 # Importing configuration from a Configuration_files module
 from Configuration_files import config
 
+# Model of the answer generation, also used to pick its context token budget
+GENERATION_MODEL = "gpt-3.5-turbo"
+
+# Tag carried by the answer generation's LLM events, used to pick its tokens out of the SRAG event stream
+GENERATION_TAG = "srag_generation"
+
 
-# Function definition for generating a response chain
+# Function definition for generating a response chain, built once per process and shared by requests
+@lru_cache(maxsize=None)
 def router_generate():
     # Prompt template for generating responses
     prompt = """You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. 
@@ -17,20 +26,19 @@ def router_generate():
                 Context: {context} Answer:
                 """
 
-    # Creating a ChatPromptTemplate object using predefined messages
+    # Creating a ChatPromptTemplate object using predefined messages; the context is only sent once, in the system prompt
     system_prompt = ChatPromptTemplate.from_messages(
         [
             ("system", prompt),  # System message with the predefined prompt
-            ("human", "{context}"),  # Human message placeholder for context
             ("human", "User question: \n\n {question}"),  # Human message placeholder for user question
         ]
     )
 
     # Initializing a ChatOpenAI object for interaction with OpenAI's language model
-    llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0)
+    llm = get_chat_model(GENERATION_MODEL, temperature=0)
 
     # Chaining components together: system prompt, OpenAI model, and output parser
-    rag_chain = system_prompt | llm | StrOutputParser()
+    rag_chain = (system_prompt | llm | StrOutputParser()).with_config(tags=[GENERATION_TAG])
 
     # Returning the chained response generator
     return rag_chain
@@ -0,0 +1,63 @@
+### Generation Grader
+
+# Importing necessary modules and classes
+import os
+from functools import lru_cache
+from typing import Literal
+
+from langchain_core.prompts import ChatPromptTemplate
+from util.llm_clients import get_chat_model
+from pydantic import Field, BaseModel
+
+# Importing configuration from a Configuration_files module
+from Configuration_files import config
+
+# Model of the grader and version of its prompt; bump the version when the prompt changes
+GRADER_MODEL = "gpt-3.5-turbo"
+PROMPT_VERSION = "1"
+
+# "sequential" runs the hallucination grader then the answer grader, "concurrent" runs both at once and
+# cancels the other as soon as one fails, "combined" asks for both verdicts in a single structured call
+GenerationGraderMode = Literal["sequential", "concurrent", "combined"]
+GENERATION_GRADER_MODE = os.getenv("SRAG_GENERATION_GRADER_MODE", "sequential")
+
+
+# Data model using Pydantic BaseModel for grading a generation on both criteria at once
+class GradeGeneration(BaseModel):
+    """Binary scores for the groundedness and the usefulness of a generated answer."""
+
+    grounded: str = Field(
+        description="Answer is grounded in the facts of the documents, 'yes' or 'no'"
+    )
+    useful: str = Field(
+        description="Answer addresses the question, 'yes' or 'no'"
+    )
+
+
+# Function definition for grading a generation against its documents and question in one call
+@lru_cache(maxsize=None)
+def router_generation_grader():
+    # Initializing ChatOpenAI with a specific model and temperature setting
+    llm = get_chat_model(GRADER_MODEL, temperature=0)
+
+    # Configuring the language model to output structured data defined by GradeGeneration
+    structured_llm_grader = llm.with_structured_output(GradeGeneration)
+
+    # Same criteria as the hallucination and answer graders, asked together
+    system = """You are a grader assessing an LLM generation against a set of documents and a user question. \n
+    Give two binary scores 'yes' or 'no'. \n
+    grounded: 'yes' means that the generation is supported by the set of facts in the documents provided,
+    i.e. the LLM model is not hallucinating. \n
+    useful: 'yes' means that the generation addresses / resolves the user question."""
+    generation_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", system),  # System message presenting the grading task
+            ("human", "documents: {documents} \n\n User question: {question} \n\n LLM generation: {generation}"),
+        ]
+    )
+
+    # Chaining the grading process: prompting user, using LLM, and grading output
+    generation_grader = generation_prompt | structured_llm_grader
+
+    # Returning the configured generation grading pipeline
+    return generation_grader
@@ -1,18 +1,38 @@
+import asyncio
+import os
 from pprint import pprint
 from typing import List
 from typing_extensions import TypedDict
+from langgraph_t import generation_grader, grade_answer, hallucination, retrieval_grader
+from langgraph_t.budget import get_budget, get_generation_grader_mode, get_retriever_mode, MAX_GENERATIONS, MAX_REWRITES
+from langgraph_t.generation_grader import router_generation_grader, GENERATION_GRADER_MODE
 from langgraph_t.hallucination import router_hallucination
-from langgraph_t.index import router_retriever
-from langgraph_t.generate import router_generate
+from langgraph_t.index import router_vector_store
+from langgraph_t.prefilter import prefilter
+from langgraph_t.search_provider import search_web
+from RAG_files.global_index import GLOBAL_INDEX_COLLECTION
+from RAG_files.hybrid_retriever import get_retriever
+from RAG_files.context_packing import pack_documents, format_documents
+from langgraph_t.generate import router_generate, GENERATION_MODEL
 from langgraph_t.question_rewriter import router_question_rewriter
 from langgraph_t.grade_answer import router_grade_answer
-from langgraph_t.retrieval_grader import router_retrieval_grader
+from langgraph_t.retrieval_grader import router_retrieval_grader, router_batch_retrieval_grader, number_documents
+from langgraph_t.retrieval_grader import get_relevance_gateway
 from langchain.schema import Document
-from langchain_community.tools.tavily_search import TavilySearchResults
 from langgraph.graph import END, StateGraph
 from Configuration_files import config
+from util.executor import run_blocking
+from util.verdict_cache import get_verdict_cache, memoized_verdict, normalize_verdict, verdict_key
 
-attempts = 0
+# "concurrent" grades every document in parallel, "batched" grades them all in one structured call,
+# "gateway" grades them together with the documents of other requests in flight (see util.llm_gateway)
+GRADER_MODE = os.getenv("SRAG_GRADER_MODE", "concurrent")
+# Maximum number of grader calls in flight for a single request in "concurrent" mode
+GRADER_CONCURRENCY = int(os.getenv("SRAG_GRADER_CONCURRENCY", "8"))
+# Number of chunks retrieved per question (the similarity retriever's default)
+RETRIEVAL_K = int(os.getenv("SRAG_RETRIEVAL_K", "4"))
+# Answer given when neither the indexed documents nor a web search turn up anything to answer from
+NO_ANSWER = "No answer found: neither the stored documents nor a web search returned relevant information."
 
 
 class GraphState(TypedDict):
@@ -23,19 +43,28 @@ class GraphState(TypedDict):
         question: question
         generation: LLM generation
         documents: list of documents
+        rewrites: number of times the question has been re-written
+        generations: number of answers generated
+        best_generation: latest generation the hallucination grader judged grounded
+        verdict: outcome of grading the latest generation
     """
 
     question: str
     generation: str
     documents: List[str]
+    rewrites: int
+    generations: int
+    best_generation: str
+    verdict: str
 
 
-def retrieve(state):
+async def retrieve(state, config=None):
     """
     Retrieve documents
 
     Args:
         state (dict): The current graph state
+        config (dict): Run config, carrying the request budget
 
     Returns:
         state (dict): Updated state with retrieved documents
@@ -43,18 +72,22 @@ def retrieve(state):
     print("---RETRIEVE---")
     question = state["question"]
 
-    # Retrieval
-    documents = router_retriever().invoke(question)
+    # Retrieval; the first call of a process back-fills the global index, so it is opened off the loop
+    vector_store = await run_blocking(router_vector_store)
+    # Vector, keyword or fused search as chosen by the request; chunks carry their scores for the pre-filter
+    retriever = get_retriever(vector_store, GLOBAL_INDEX_COLLECTION, get_retriever_mode(config), k=RETRIEVAL_K)
+    documents = await retriever.ainvoke(question, config=config)
     state["documents"] = documents
     return state
 
 
-def generate(state):
+async def generate(state, config=None):
     """
     Generate answer
 
     Args:
         state (dict): The current graph state
+        config (dict): Run config, carrying the request budget
 
     Returns:
         state (dict): Updated state with generation
@@ -63,18 +96,27 @@ def generate(state):
     question = state["question"]
     documents = state["documents"]
 
+    # Most relevant, non-duplicate chunks within the model's context budget; the graders see the same set
+    documents = pack_documents(documents, GENERATION_MODEL)
+    state["documents"] = documents
+
     # RAG generation
-    generation = router_generate().invoke({"context": documents, "question": question})
+    generation = await router_generate().ainvoke({"context": format_documents(documents), "question": question},
+                                                 config=config)
     state["generation"] = generation
+    state["generations"] = state.get("generations", 0) + 1
+    # Not graded yet
+    state["verdict"] = None
     return state
 
 
-def grade_documents(state):
+async def grade_documents(state, config=None):
     """
     Determines whether the retrieved documents are relevant to the question.
 
     Args:
         state (dict): The current graph state
+        config (dict): Run config, carrying the request budget
 
     Returns:
         state (dict): Updated state with filtered relevant documents
@@ -84,13 +126,10 @@ def grade_documents(state):
     question = state["question"]
     documents = state["documents"]
 
-    # Score each doc
+    # Score all docs at once
+    grades = await grade_relevance(question, documents, config)
     filtered_docs = []
-    for d in documents:
-        score = router_retrieval_grader().invoke(
-            {"question": question, "document": d.page_content}
-        )
-        grade = score.binary_score
+    for d, grade in zip(documents, grades):
         if grade == "yes":
             print("---GRADE: DOCUMENT RELEVANT---")
             filtered_docs.append(d)
@@ -102,12 +141,67 @@ def grade_documents(state):
     return state
 
 
-def transform_query(state):
+async def grade_relevance(question, documents, config=None):
+    """
+    Grade the relevance of every document to the question.
+
+    Args:
+        question (str): The user question
+        documents (list): Retrieved documents
+        config (dict): Run config of the grader calls
+
+    Returns:
+        list: 'yes' or 'no' per document, in document order
+    """
+    # Clearly relevant and clearly irrelevant chunks are decided locally from similarity and BM25 overlap
+    grades = prefilter(question, documents)
+    # Chunks already graded against this question (in this run or an earlier request) are not sent again;
+    # the single and batched graders apply the same criteria, so they share verdicts
+    cache = get_verdict_cache()
+    keys = [verdict_key("retrieval", retrieval_grader.PROMPT_VERSION, retrieval_grader.GRADER_MODEL, question,
+                        d.page_content) for d in documents]
+    grades = [grade if grade is not None else cache.get(key) for grade, key in zip(grades, keys)]
+    pending = [i for i, grade in enumerate(grades) if grade is None]
+    if pending:
+        verdicts = await grade_pending(question, [documents[i] for i in pending], config)
+        for i, verdict in zip(pending, verdicts):
+            grades[i] = verdict
+            cache.put(keys[i], verdict)
+    return grades
+
+
+async def grade_pending(question, documents, config=None):
+    """
+    Grade documents that have no memoized verdict, in the configured grader mode.
+    """
+    if GRADER_MODE == "gateway":
+        # Shared batches are not attributed to any one request, so they do not count against its budget
+        verdicts = await asyncio.gather(*(get_relevance_gateway().acall((question, d.page_content)) for d in documents))
+        return [normalize_verdict(verdict) for verdict in verdicts]
+
+    if GRADER_MODE == "batched":
+        score = await router_batch_retrieval_grader().ainvoke(
+            {"question": question, "documents": number_documents(documents)}, config=config
+        )
+        if len(score.binary_scores) == len(documents):
+            return [normalize_verdict(grade) for grade in score.binary_scores]
+        print("---BATCHED GRADER RETURNED A WRONG NUMBER OF VERDICTS, GRADING CONCURRENTLY---")
+
+    # One grader chain, all documents in flight at once up to the concurrency cap
+    scores = await router_retrieval_grader().abatch(
+        [{"question": question, "document": d.page_content} for d in documents],
+        config={**(config or {}), "max_concurrency": GRADER_CONCURRENCY},
+    )
+    return [normalize_verdict(score.binary_score) for score in scores]
+
+
+async def transform_query(state, config=None):
     """
     Transform the query to produce a better question.
 
     Args:
         state (dict): The current graph state
+        config (dict): Run config, carrying the request budget
 
     Returns:
         state (dict): Updated state with re-phrased question
@@ -117,27 +211,36 @@ def transform_query(state):
     question = state["question"]
 
     # Re-write question
-    better_question = router_question_rewriter().invoke({"question": question})
+    better_question = await router_question_rewriter().ainvoke({"question": question}, config=config)
     state["question"] = better_question
+    state["rewrites"] = state.get("rewrites", 0) + 1
     return state
 
 
-def web_search(state):
+async def web_search(state, config=None):
     """
     Web search based on the re-phrased question.
 
     Args:
         state (dict): The current graph state
+        config (dict): Run config, carrying the request budget
 
     Returns:
         state (dict): Updated state with web search results
     """
-    web_search_tool = TavilySearchResults(k=2)
     print("---WEB SEARCH---")
     question = state["question"]
 
-    # Web search
-    docs = web_search_tool.invoke({"query": question})
+    # Web search through the shared provider; recent identical searches come from the cache
+    docs = await search_web(question)
+    if not docs:
+        # Search found nothing, failed or timed out: say so rather than generating from no context
+        print("---DECISION: NO WEB RESULTS, NO ANSWER---")
+        state["documents"] = []
+        state["generation"] = NO_ANSWER
+        state["best_generation"] = None
+        state["verdict"] = "no answer"
+        return state
     web_results = "\n".join([d["content"] for d in docs])
     web_results = Document(page_content=web_results)
 
@@ -147,30 +250,34 @@ def web_search(state):
 
 ### Edges ###
 
-def decide_to_generate(state):
+def decide_to_generate(state, config=None):
     """
     Determines whether to generate an answer, or re-generate a question.
 
     Args:
         state (dict): The current graph state
+        config (dict): Run config, carrying the request budget
 
     Returns:
         str: Next node to call
     """
 
-    global attempts
     print("---ASSESS GRADED DOCUMENTS---")
     filtered_documents = state["documents"]
-    if not filtered_documents and attempts < 2:
+    rewrites = state.get("rewrites", 0)
+    budget = get_budget(config)
+    if budget and budget.exhausted():
+        # Out of budget: keep the answer we have, or produce one from what is left
+        print(f"---DECISION: BUDGET EXHAUSTED ({budget.exhausted()})---")
+        return "stop" if state.get("generation") else "generate"
+    if not filtered_documents and rewrites < MAX_REWRITES:
         # All documents have been filtered as irrelevant, try re-generating a new query
-        attempts += 1
-        print("\n\nattempts : ", attempts)
+        print("\n\nattempts : ", rewrites + 1)
         print("---DECISION: ALL DOCUMENTS ARE NOT RELEVANT TO QUESTION, TRANSFORM QUERY---")
         return "transform_query"
     elif not filtered_documents:
-        # If attempts are 5 or more, go to web search
+        # If the question has been re-written too often, go to web search
         print("---DECISION: ATTEMPTS EXCEEDED, PERFORM WEB SEARCH---")
-        attempts = 0
         return "web_search"
     else:
         # We have relevant documents, so generate answer
@@ -178,43 +285,170 @@ def decide_to_generate(state):
         return "generate"
 
 
-def grade_generation_v_documents_and_question(state):
+def decide_after_web_search(state):
+    """
+    End the graph with the no answer response when the web search returned nothing.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        str: Next node to call
+    """
+    return "generate" if state["documents"] else "no answer"
+
+
+def decide_after_grading(state):
+    """
+    Route on the verdict of grade_generation_v_documents_and_question.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        str: Next node to call
+    """
+    return state["verdict"]
+
+
+async def grade_generation_v_documents_and_question(state, config=None):
     """
     Determines whether the generation is grounded in the document and answers question.
 
     Args:
         state (dict): The current graph state
+        config (dict): Run config, carrying the request budget
 
     Returns:
-        str: Decision for next node to call
+        state (dict): Updated state with the verdict and, for a grounded generation, the best generation
     """
 
-    print("---CHECK HALLUCINATIONS---")
     question = state["question"]
     documents = state["documents"]
     generation = state["generation"]
+    budget = get_budget(config)
+    if budget and budget.exhausted():
+        # Grading would only lead to more LLM calls, return the best answer so far
+        print(f"---DECISION: BUDGET EXHAUSTED ({budget.exhausted()}), RETURN BEST GENERATION---")
+        state["verdict"] = "stop"
+        return state
+    if state.get("generations", 0) >= MAX_GENERATIONS:
+        # The latest generation is left ungraded, so the best graded one is returned instead
+        print("---DECISION: GENERATIONS EXCEEDED, RETURN BEST GENERATION---")
+        state["verdict"] = "stop"
+        return state
 
-    score = router_hallucination().invoke(
-        {"documents":documents,"generation": generation}
-    )
-    grade = score.binary_score
+    print("---CHECK HALLUCINATIONS---")
+    state["verdict"], grounded = await grade_generation(question, documents, generation, config)
+    # Only a generation whose grounding was checked may be returned when SRAG stops early
+    if grounded == "yes":
+        state["best_generation"] = generation
+    return state
+
+
+async def grade_generation(question, documents, generation, config=None):
+    """
+    Grade a generation in the requested generation grader mode.
+
+    Returns:
+        tuple: 'not supported', 'useful' or 'not useful', and the grounding verdict ('yes', 'no' or None
+            when the answer was found not useful before its grounding was known)
+    """
+    context = format_documents(documents)
+    mode = get_generation_grader_mode(config) or GENERATION_GRADER_MODE
+    if mode == "combined":
+        grounded, useful = await grade_generation_combined(question, context, generation, config)
+    elif mode == "concurrent":
+        grounded, useful = await grade_generation_concurrent(question, context, generation, config)
+    else:
+        grounded, useful = await grade_generation_sequential(question, context, generation, config)
 
     # Check hallucination
-    if grade == "yes":
+    if grounded is not None and grounded != "yes":
+        pprint("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
+        return "not supported", grounded
+    if grounded == "yes":
         print("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
-        # Check question-answering
-        print("---GRADE GENERATION vs QUESTION---")
-        score = router_grade_answer().invoke({"question": question, "generation": generation})
-        grade = score.binary_score
-        if grade == "yes":
-            print("---DECISION: GENERATION ADDRESSES QUESTION---")
-            return "useful"
-        else:
-            print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
-            return "not useful"
+    # Check question-answering
+    if useful == "yes":
+        print("---DECISION: GENERATION ADDRESSES QUESTION---")
+        return "useful", grounded
     else:
-        pprint("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
-        return "not supported"
+        print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
+        return "not useful", grounded
+
+
+def hallucination_verdict(context, generation, config=None):
+    # A regenerated answer identical to a rejected one over the same documents is not graded twice
+    return memoized_verdict(
+        verdict_key("hallucination", hallucination.PROMPT_VERSION, hallucination.GRADER_MODEL, generation, context),
+        router_hallucination(),
+        {"documents": context, "generation": generation},
+        config,
+    )
+
+
+def answer_verdict(question, generation, config=None):
+    return memoized_verdict(
+        verdict_key("answer", grade_answer.PROMPT_VERSION, grade_answer.GRADER_MODEL, question, generation),
+        router_grade_answer(),
+        {"question": question, "generation": generation},
+        config,
+    )
+
+
+async def grade_generation_sequential(question, context, generation, config=None):
+    """
+    Hallucination grader, then the answer grader only for a grounded generation.
+
+    Returns:
+        tuple: ('yes' or 'no', 'yes', 'no' or None when not graded)
+    """
+    grounded = await hallucination_verdict(context, generation, config)
+    if grounded != "yes":
+        return "no", None
+    print("---GRADE GENERATION vs QUESTION---")
+    return "yes", await answer_verdict(question, generation, config)
+
+
+async def grade_generation_concurrent(question, context, generation, config=None):
+    """
+    Both graders at once; the first 'no' decides and the other call is cancelled.
+
+    An answer found not useful before its grounding is known is reported with grounding None: the
+    question is rewritten rather than the answer regenerated, but the answer is not taken as grounded.
+    """
+    grounded_task = asyncio.ensure_future(hallucination_verdict(context, generation, config))
+    useful_task = asyncio.ensure_future(answer_verdict(question, generation, config))
+    pending = {grounded_task, useful_task}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if grounded_task in done and grounded_task.result() != "yes":
+                return "no", None
+            if useful_task in done and useful_task.result() != "yes":
+                return "yes" if grounded_task.done() else None, "no"
+        return "yes", "yes"
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def grade_generation_combined(question, context, generation, config=None):
+    """
+    Both verdicts from a single structured call, memoized together.
+    """
+    cache = get_verdict_cache()
+    key = verdict_key("generation", generation_grader.PROMPT_VERSION, generation_grader.GRADER_MODEL, question,
+                      f"{generation}\n\n{context}")
+    verdicts = cache.get(key)
+    if verdicts is None:
+        score = await router_generation_grader().ainvoke(
+            {"documents": context, "question": question, "generation": generation}, config=config
+        )
+        verdicts = (normalize_verdict(score.grounded), normalize_verdict(score.useful))
+        cache.put(key, verdicts)
+    return verdicts
 
 
 def create_graph():
@@ -226,6 +460,7 @@ def create_graph():
     graph_builder.add_node("grade_documents", grade_documents)  # grade documents
     graph_builder.add_node("generate", generate)  # generate
     graph_builder.add_node("transform_query", transform_query)  # transform_query
+    graph_builder.add_node("grade_generation", grade_generation_v_documents_and_question)  # grade generation
 
     # Build graph
     graph_builder.set_entry_point("retrieve")
@@ -237,17 +472,27 @@ def create_graph():
             "transform_query": "transform_query",
             "generate": "generate",
             "web_search": "web_search",
+            "stop": END,
         },
     )
     graph_builder.add_edge("transform_query", "retrieve")
-    graph_builder.add_edge("web_search", "generate")
     graph_builder.add_conditional_edges(
-        "generate",
-        grade_generation_v_documents_and_question,
+        "web_search",
+        decide_after_web_search,
+        {
+            "generate": "generate",
+            "no answer": END,
+        },
+    )
+    graph_builder.add_edge("generate", "grade_generation")
+    graph_builder.add_conditional_edges(
+        "grade_generation",
+        decide_after_grading,
         {
             "not supported": "generate",
             "useful": END,
             "not useful": "transform_query",
+            "stop": END,
         },
     )
 
@@ -1,14 +1,19 @@
 ### Hallucination Grader
 
 # Importing necessary modules and classes
+from functools import lru_cache
 from langchain_core.outputs import generation
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from util.llm_clients import get_chat_model
 from pydantic import Field, BaseModel
 
 # Importing configuration from a Configuration_files module
 from Configuration_files import config
 
+# Model of the grader and version of its prompt; bump the version when the prompt changes
+GRADER_MODEL = "gpt-3.5-turbo"
+PROMPT_VERSION = "2"
+
 
 # Data model using Pydantic BaseModel for defining the structure of graded hallucinations
 class GradeHallucinations(BaseModel):
@@ -20,9 +25,10 @@ class GradeHallucinations(BaseModel):
 
 
 # Function definition for grading hallucinations in generated answers
+@lru_cache(maxsize=None)
 def router_hallucination():
     # Initializing ChatOpenAI with a specific model and temperature setting
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+    llm = get_chat_model(GRADER_MODEL, temperature=0)
 
     # Configuring the language model to output structured data defined by GradeHallucinations
     structured_llm_grader = llm.with_structured_output(GradeHallucinations)
@@ -1,16 +1,18 @@
 ### Build Index
 
 # Importing necessary modules and classes
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
+from util.vector_store_registry import get_vector_store
 from RAG_files.RAG_input_and_storage import doc_loader, webloader
 from Configuration_files import config
-from util.db_manager import display_all_files_with_index
+from util.db_manager import connect_db, display_all_files_with_index
 from langchain_community.vectorstores import Chroma as ChromaVectorStore
 from RAG_files.RAG_file_retriever import retrieve_documents
-import sqlite3
+from RAG_files.global_index import get_global_index, add_to_global_index, is_in_global_index
+from util.answer_cache import invalidate_answers, GLOBAL_SCOPE
+
+# Set once the merged SRAG index has been back-filled with collections stored before it existed
+global_index_synced = False
 
 
 # Function to determine loader based on URL type (local file or web resource)
@@ -26,52 +28,47 @@ def get_doc_store(ref_ids):
     dt = []
     mt = []
     for ref_id in ref_ids:
-        # Initialize Chroma vector store for document embeddings
-        vector_store = Chroma(
-            persist_directory=r"C:\Users\avane\PycharmProjects\aiportfolio\chromadb_persist",
-            embedding_function=OpenAIEmbeddings(),
-            collection_name=f"document_embeddings_{ref_id}"
-        )
+        # Get the shared Chroma vector store for document embeddings
+        vector_store = get_vector_store(f"document_embeddings_{ref_id}")
         # Retrieve documents and metadatas from the Chroma vector store
-        dt.extend(vector_store.get()["documents"])
-        mt.extend(vector_store.get()["metadatas"])
+        stored = vector_store.get()
+        dt.extend(stored["documents"])
+        mt.extend(stored["metadatas"])
     return dt, mt
 
 
 # Function to retrieve reference IDs for documents from SQLite database
 def get_ref_ids():
-    sqlite_conn = sqlite3.connect(r"sqlite3_db/file_references.db")
+    sqlite_conn = connect_db()
     ref_ids = []
-    file_info = display_all_files_with_index(sqlite_conn)
+    try:
+        file_info = display_all_files_with_index(sqlite_conn)
+    finally:
+        sqlite_conn.close()  # Return the connection to the pool
     for i, j in file_info.items():
         if "file" not in j["reference_id"]:
             ref_ids.append(j["reference_id"])
     return ref_ids
 
 
-# Function to build and return a retriever for document indexing
-def router_retriever():
-    # Set embeddings using OpenAIEmbeddings
-    embd = OpenAIEmbeddings()
-    # Load documents and metadata from Chroma vector stores based on reference IDs
-    docs, metadata = get_doc_store(get_ref_ids())
-    # Initialize RecursiveCharacterTextSplitter for splitting documents into chunks
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=500, chunk_overlap=0
-    )
-
-    # Create document splits using text splitter and provided documents with metadata
-    doc_splits = text_splitter.create_documents(texts=docs, metadatas=metadata)
-
-    # Initialize Chroma vector store from document splits with embeddings
-    vectorstore = Chroma.from_documents(
-        documents=doc_splits,
-        collection_name="rag-chroma",
-        embedding=embd,
-    )
+# Function to back-fill the merged SRAG index with collections that are not in it yet
+def sync_global_index(ref_ids):
+    for ref_id in ref_ids:
+        if is_in_global_index(ref_id):
+            continue
+        # Re-use the stored texts of the per-document collection instead of reloading the source
+        docs, metadata = get_doc_store([ref_id])
+        documents = [Document(page_content=d, metadata=m or {}) for d, m in zip(docs, metadata)]
+        add_to_global_index(documents, ref_id)
+        invalidate_answers(GLOBAL_SCOPE)
 
-    # Create and configure retriever for document indexing based on similarity
-    retriever = vectorstore.as_retriever(search_type="similarity")
 
-    # Return the configured retriever for further use
-    return retriever
+# Function to return the merged vector store searched by the SRAG retriever
+def router_vector_store():
+    global global_index_synced
+    # The merged index is maintained by store_chromadb / delete_entry_from_db, so it is only
+    # reconciled with SQLite once per process rather than rebuilt on every question
+    if not global_index_synced:
+        sync_global_index(get_ref_ids())
+        global_index_synced = True
+    return get_global_index()
@@ -1,19 +1,62 @@
+from functools import lru_cache
 from pprint import pprint  # Importing pprint for pretty-printing output
 
 from langgraph_t.graph_route import create_graph  # Importing create_graph function from langgraph_t.graph_route
+from langgraph_t.budget import RequestBudget, budget_config
+from langgraph_t.generate import router_generate, GENERATION_TAG
+from langgraph_t.generation_grader import router_generation_grader
+from langgraph_t.grade_answer import router_grade_answer
+from langgraph_t.hallucination import router_hallucination
+from langgraph_t.question_rewriter import router_question_rewriter
+from langgraph_t.retrieval_grader import router_retrieval_grader, router_batch_retrieval_grader
+from langgraph_t.retrieval_grader import router_pair_batch_retrieval_grader
+from util.answer_cache import lookup_answer, store_answer, GLOBAL_SCOPE
+from util.executor import run_blocking
 
+# Nodes of the SRAG graph reported as progress events while streaming
+GRAPH_NODES = ("retrieve", "grade_documents", "transform_query", "web_search", "generate", "grade_generation")
 
-def generate_rag_answer(question):
-    global value  # Declaring 'value' as a global variable
 
-    # Creating a graph application instance using create_graph function
-    app = create_graph()
+# Compile the graph once per process; the compiled graph keeps no per-request state
+@lru_cache(maxsize=None)
+def get_graph():
+    return create_graph()
 
-    # Setting up inputs for the graph application
-    inputs = {"question": question}
+
+def warm_up():
+    """
+    Build the SRAG chains and compile the graph ahead of the first request.
+    """
+    for factory in (router_generate, router_grade_answer, router_hallucination, router_generation_grader,
+                    router_question_rewriter, router_retrieval_grader, router_batch_retrieval_grader,
+                    router_pair_batch_retrieval_grader):
+        factory()
+    get_graph()
+
+
+def best_answer(state):
+    """
+    The answer to return from a final graph state: the latest generation judged grounded, else the latest one.
+    """
+    return state.get("best_generation") or state.get("generation")
+
+
+async def generate_rag_answer(question, retriever_mode=None, generation_grader=None):
+    # Skip retrieval, grading and generation when a similar question was answered over the same corpus
+    budget = RequestBudget()
+    cached = await run_blocking(lookup_answer, GLOBAL_SCOPE, question)
+    if cached is not None:
+        return {"user": question, "srag - genai_response": cached, "budget": budget.usage()}
+
+    # Getting the shared graph application instance
+    app = get_graph()
+
+    # Setting up inputs for the graph application; retry counters live in the per-request state
+    inputs = {"question": question, "rewrites": 0, "generations": 0}
 
     # Iterating over outputs from the graph application
-    for output in app.stream(inputs):
+    value = None
+    async for output in app.astream(inputs, config=budget_config(budget, retriever_mode, generation_grader)):
         for key, value in output.items():
             # Printing the node key using pprint for better readability
             pprint(f"Node '{key}':")
@@ -21,10 +64,57 @@ def generate_rag_answer(question):
         # Printing a separator for readability
         pprint("\n---\n")
 
+        # Out of budget with an answer in hand: return it without waiting for the graders
+        if budget.exhausted() and value.get("generation"):
+            break
+
     # Printing the generated answer retrieved from the graph application's output
-    print(value["generation"])
+    answer = best_answer(value)
+    print(answer)
+    # Only answers the graders judged useful are cached; ungraded or rejected ones are not served again
+    if value.get("verdict") == "useful":
+        await run_blocking(store_answer, GLOBAL_SCOPE, question, answer)
 
-    # Returning a dictionary with the user question and the generated response
+    # Returning a dictionary with the user question, the generated response and the budget used
     return {"user": question,
-            "srag - genai_response": value["generation"]}
+            "srag - genai_response": answer,
+            "budget": budget.usage()}
+
+
+async def stream_rag_answer(question, retriever_mode=None, generation_grader=None):
+    """
+    Stream the SRAG pipeline as events: ("node", ...) when a graph node finishes, ("token", ...) for
+    every token of the answer generation, then a final ("answer", ...) event.
+
+    A generation rejected by the hallucination or answer grader is followed by a new one; its tokens
+    carry the next "attempt" number, so clients should only show the tokens of the latest attempt.
+    """
+    budget = RequestBudget()
+    cached = await run_blocking(lookup_answer, GLOBAL_SCOPE, question)
+    if cached is not None:
+        yield "answer", {"user": question, "srag - genai_response": cached, "budget": budget.usage()}
+        return
+
+    app = get_graph()
+    attempt = 0
+    state = {}
+    inputs = {"question": question, "rewrites": 0, "generations": 0}
+    config = budget_config(budget, retriever_mode, generation_grader)
+    async for event in app.astream_events(inputs, config=config, version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_stream" and GENERATION_TAG in event.get("tags", []):
+            token = event["data"]["chunk"].content
+            if token:
+                yield "token", {"token": token, "attempt": attempt}
+        elif kind == "on_chain_start" and event["name"] == "generate":
+            attempt += 1
+        elif kind == "on_chain_end" and event["name"] in GRAPH_NODES:
+            yield "node", {"node": event["name"]}
+            state = event["data"]["output"]
+            if event["name"] == "generate" and budget.exhausted():
+                break
 
+    answer = best_answer(state)
+    if state.get("verdict") == "useful":
+        await run_blocking(store_answer, GLOBAL_SCOPE, question, answer)
+    yield "answer", {"user": question, "srag - genai_response": answer, "budget": budget.usage()}
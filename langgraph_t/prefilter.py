@@ -0,0 +1,56 @@
+### Relevance Pre-filter
+
+# Importing necessary modules and classes
+import os
+
+from RAG_files.hybrid_retriever import SIMILARITY_KEY
+from RAG_files.lexical import lexical_scores
+
+# Local scoring of retrieved chunks before the LLM grader: chunks scoring at or above ACCEPT are relevant,
+# at or below REJECT irrelevant, and only the band in between is sent to the grader
+PREFILTER_ENABLED = os.getenv("SRAG_PREFILTER", "on") == "on"
+PREFILTER_ACCEPT = float(os.getenv("SRAG_PREFILTER_ACCEPT", "0.85"))
+PREFILTER_REJECT = float(os.getenv("SRAG_PREFILTER_REJECT", "0.25"))
+# Share of the lexical (BM25) score in the combined score, the rest being the retrieval similarity
+PREFILTER_LEXICAL_WEIGHT = float(os.getenv("SRAG_PREFILTER_LEXICAL_WEIGHT", "0.3"))
+
+
+def combined_scores(question, documents, lexical_weight=PREFILTER_LEXICAL_WEIGHT):
+    """
+    Combine the retrieval similarity and the BM25 overlap of each document with the question.
+
+    Documents without a similarity score (keyword-only hits) get None: the scaled BM25 alone stays low even
+    for exact-term matches, which are what the keyword search is there to find, so only the grader decides them.
+    """
+    lexical = lexical_scores(question, [d.page_content for d in documents])
+    scores = []
+    for d, lexical_score in zip(documents, lexical):
+        similarity = d.metadata.get(SIMILARITY_KEY)
+        if similarity is None:
+            scores.append(None)
+        else:
+            scores.append((1 - lexical_weight) * similarity + lexical_weight * lexical_score)
+    return scores
+
+
+def band(score, accept=PREFILTER_ACCEPT, reject=PREFILTER_REJECT):
+    """
+    'yes' above the accept threshold, 'no' below the reject threshold, None for the ambiguous middle
+    and for unscored documents.
+    """
+    if score is None:
+        return None
+    if score >= accept:
+        return "yes"
+    if score <= reject:
+        return "no"
+    return None
+
+
+def prefilter(question, documents):
+    """
+    Local verdict per document: 'yes', 'no', or None when the LLM grader has to decide.
+    """
+    if not PREFILTER_ENABLED:
+        return [None] * len(documents)
+    return [band(score) for score in combined_scores(question, documents)]
@@ -1,15 +1,17 @@
 # Question Re-writer
 
 # Importing necessary modules and classes
+from functools import lru_cache
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from util.llm_clients import get_chat_model
 from Configuration_files import config
 
 
+@lru_cache(maxsize=None)
 def router_question_rewriter():
     # Initialize ChatOpenAI instance for language model (LLM)
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+    llm = get_chat_model("gpt-3.5-turbo", temperature=0)
 
     # Define system prompt message for guiding the question rewriting process
     system = """You a question re-writer that converts an input question to a better version that is optimized \n 
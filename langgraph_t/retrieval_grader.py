@@ -1,11 +1,20 @@
 ### Retrieval Grader
 
 # Importing necessary modules and classes
+from functools import lru_cache
+from typing import List
+
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from util.llm_clients import get_chat_model
+from util.llm_gateway import get_batcher, GATEWAY_GRADE_BATCH_SIZE
 from pydantic import BaseModel, Field
 from Configuration_files import config
 
+# Model of the retrieval graders and version of their prompts; bump the version when a prompt changes so
+# that memoized verdicts given under the old prompt are no longer used
+GRADER_MODEL = "gpt-3.5-turbo"
+PROMPT_VERSION = "1"
+
 
 # Data model definition using Pydantic BaseModel
 class GradeDocuments(BaseModel):
@@ -16,9 +25,10 @@ class GradeDocuments(BaseModel):
     )
 
 
+@lru_cache(maxsize=None)
 def router_retrieval_grader():
     # Initialize ChatOpenAI instance for language model (LLM)
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+    llm = get_chat_model(GRADER_MODEL, temperature=0)
 
     # Configure LLM to produce structured output based on GradeDocuments model
     structured_llm_grader = llm.with_structured_output(GradeDocuments)
@@ -43,3 +53,99 @@ def router_retrieval_grader():
 
     # Return the configured retrieval grading pipeline
     return retrieval_grader
+
+
+# Data model for grading several retrieved documents in a single call
+class GradeDocumentsBatch(BaseModel):
+    """Binary relevance scores for a numbered list of retrieved documents, in the same order."""
+
+    binary_scores: List[str] = Field(
+        description="One 'yes' or 'no' per document, in document order, saying whether it is relevant to the question"
+    )
+
+
+@lru_cache(maxsize=None)
+def router_batch_retrieval_grader():
+    # Initialize ChatOpenAI instance for language model (LLM)
+    llm = get_chat_model(GRADER_MODEL, temperature=0)
+
+    # Configure LLM to produce one structured verdict per document
+    structured_llm_grader = llm.with_structured_output(GradeDocumentsBatch)
+
+    # Define system prompt message for grading a numbered list of documents at once
+    system = """You are a grader assessing relevance of retrieved documents to a user question. \n 
+        You are given a numbered list of documents. For each document, if it contains keyword(s) or semantic meaning 
+        related to the user question, grade it as relevant. \n
+        It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
+        Return exactly one binary score 'yes' or 'no' per document, in the order the documents are numbered."""
+
+    # Create ChatPromptTemplate for structured prompting and responses
+    grade_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", system),  # System message providing instructions
+            ("human", "Retrieved documents: \n\n {documents} \n\n User question: {question}"),
+            # Placeholder for user input
+        ]
+    )
+
+    # Construct the batched retrieval grading pipeline: prompt -> LLM -> output parser
+    return grade_prompt | structured_llm_grader
+
+
+# Function to format documents as the numbered list expected by the batched grader
+def number_documents(documents):
+    return "\n\n".join(f"Document {i + 1}:\n{d.page_content}" for i, d in enumerate(documents))
+
+
+@lru_cache(maxsize=None)
+def router_pair_batch_retrieval_grader():
+    # Initialize ChatOpenAI instance for language model (LLM)
+    llm = get_chat_model(GRADER_MODEL, temperature=0)
+
+    # Configure LLM to produce one structured verdict per (question, document) pair
+    structured_llm_grader = llm.with_structured_output(GradeDocumentsBatch)
+
+    # Define system prompt message for grading pairs gathered from several requests at once
+    system = """You are a grader assessing relevance of retrieved documents to user questions. \n 
+        You are given a numbered list of pairs, each made of a user question and a retrieved document. For each pair, 
+        if the document contains keyword(s) or semantic meaning related to its user question, grade it as relevant. \n
+        It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
+        Return exactly one binary score 'yes' or 'no' per pair, in the order the pairs are numbered."""
+
+    # Create ChatPromptTemplate for structured prompting and responses
+    grade_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", system),  # System message providing instructions
+            ("human", "Pairs to grade: \n\n {pairs}"),  # Placeholder for user input
+        ]
+    )
+
+    # Construct the pair grading pipeline: prompt -> LLM -> output parser
+    return grade_prompt | structured_llm_grader
+
+
+# Function to format (question, document) pairs as the numbered list expected by the pair grader
+def number_pairs(pairs):
+    return "\n\n".join(f"Pair {i + 1}:\nUser question: {question}\nRetrieved document:\n{document}"
+                       for i, (question, document) in enumerate(pairs))
+
+
+def grade_pairs(pairs):
+    """
+    Batch function of the relevance gateway: grade (question, document) pairs of several requests in one call.
+    """
+    score = router_pair_batch_retrieval_grader().invoke({"pairs": number_pairs(pairs)})
+    if len(score.binary_scores) == len(pairs):
+        return score.binary_scores
+    # A wrong number of verdicts cannot be matched back to the pairs, so grade them one by one
+    scores = router_retrieval_grader().batch([{"question": question, "document": document}
+                                              for question, document in pairs])
+    return [score.binary_score for score in scores]
+
+
+@lru_cache(maxsize=None)
+def get_relevance_gateway():
+    """
+    Return the gateway that grades the pending documents of concurrent requests together.
+    """
+    return get_batcher("retrieval_grader", grade_pairs, GATEWAY_GRADE_BATCH_SIZE)
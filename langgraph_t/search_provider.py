@@ -0,0 +1,214 @@
+### Web Search Providers
+
+# Importing necessary modules and classes
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+
+from RAG_files.lexical import lexical_scores
+from util.executor import run_blocking
+from util.verdict_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# "tavily" searches the web, "local" a file or SQLite corpus (offline load tests)
+WEB_SEARCH_PROVIDER = os.getenv("WEB_SEARCH_PROVIDER", "tavily")
+WEB_SEARCH_K = int(os.getenv("WEB_SEARCH_K", "2"))
+# Seconds a search may take before the node goes on with an empty result
+WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "10"))
+# Seconds a search result is re-used for the same normalized query (0 disables the cache)
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "3600"))
+WEB_SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "1000"))
+# Corpus of the local provider: a JSON file (list of {"url", "content"}) or an SQLite file with a pages table
+LOCAL_SEARCH_PATH = os.getenv("LOCAL_SEARCH_PATH", "sqlite3_db/local_search.db")
+# Fixed delay in seconds added to every local search, to stand in for the network
+LOCAL_SEARCH_LATENCY = float(os.getenv("LOCAL_SEARCH_LATENCY", "0"))
+
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+
+search_provider = None
+search_cache = None
+provider_lock = threading.Lock()
+
+
+class TavilySearchProvider:
+    """
+    Tavily search API over one keep-alive HTTP client shared by every request.
+    """
+
+    name = "tavily"
+
+    def __init__(self, api_key=None, timeout=WEB_SEARCH_TIMEOUT):
+        self.api_key = api_key or os.getenv("TAVILY_API_KEY")
+        self.client = httpx.AsyncClient(timeout=timeout)
+
+    async def search(self, query, k):
+        """
+        Return the top k results as a list of {"url", "content"} dicts.
+        """
+        response = await self.client.post(TAVILY_SEARCH_URL, json={
+            "api_key": self.api_key,
+            "query": query,
+            "max_results": k,
+            "search_depth": "advanced",
+            "include_answer": False,
+            "include_raw_content": False,
+            "include_images": False,
+        })
+        response.raise_for_status()
+        return [{"url": result["url"], "content": result["content"]} for result in response.json().get("results", [])]
+
+
+class LocalSearchProvider:
+    """
+    Search over a local corpus of pages ranked by BM25, with a fixed latency so load tests are repeatable.
+
+    The corpus is read once, from a JSON file or from the pages (url, content) table of an SQLite file.
+    """
+
+    name = "local"
+
+    def __init__(self, path=LOCAL_SEARCH_PATH, latency=LOCAL_SEARCH_LATENCY):
+        self.path = path
+        self.latency = latency
+        self.pages = None
+        self.lock = threading.Lock()
+
+    def load_pages(self):
+        with self.lock:
+            if self.pages is None:
+                if self.path.endswith(".json"):
+                    with open(self.path, encoding="utf-8") as f:
+                        self.pages = [{"url": page.get("url", ""), "content": page["content"]} for page in json.load(f)]
+                else:
+                    sqlite_conn = sqlite3.connect(self.path)
+                    try:
+                        rows = sqlite_conn.execute("SELECT url, content FROM pages").fetchall()
+                    finally:
+                        sqlite_conn.close()
+                    self.pages = [{"url": url, "content": content} for url, content in rows]
+            return self.pages
+
+    def rank(self, query, k):
+        pages = self.load_pages()
+        scores = lexical_scores(query, [page["content"] for page in pages])
+        ranked = sorted(zip(scores, range(len(pages))), key=lambda item: (-item[0], item[1]))
+        return [pages[i] for score, i in ranked[:k] if score > 0]
+
+    async def search(self, query, k):
+        results = await run_blocking(self.rank, query, k)
+        await asyncio.sleep(self.latency)
+        return results
+
+
+class SearchCache:
+    """
+    Bounded LRU map of search results that expire after a TTL.
+    """
+
+    def __init__(self, max_entries=WEB_SEARCH_CACHE_SIZE, ttl=WEB_SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.results.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.results.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.results.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, results):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.results[key] = (time.monotonic(), results)
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "entries": len(self.results)}
+
+
+def create_search_provider(name=WEB_SEARCH_PROVIDER):
+    if name == "local":
+        return LocalSearchProvider()
+    if name == "tavily":
+        return TavilySearchProvider()
+    raise ValueError(f"Unknown web search provider: {name}")
+
+
+def get_search_provider():
+    """
+    Return the process-wide provider selected by WEB_SEARCH_PROVIDER.
+    """
+    global search_provider
+    with provider_lock:
+        if search_provider is None:
+            search_provider = create_search_provider()
+    return search_provider
+
+
+def set_search_provider(provider):
+    """
+    Replace the process-wide provider (e.g. with a LocalSearchProvider over a test corpus).
+    """
+    global search_provider
+    with provider_lock:
+        search_provider = provider
+    get_search_cache().clear()
+
+
+def get_search_cache():
+    global search_cache
+    with provider_lock:
+        if search_cache is None:
+            search_cache = SearchCache()
+    return search_cache
+
+
+async def search_web(query, k=WEB_SEARCH_K, timeout=WEB_SEARCH_TIMEOUT):
+    """
+    Search results for a query, re-used from the cache when the same normalized query was searched recently.
+
+    A search that fails or exceeds the timeout returns an empty list (and is not cached). Like a search
+    without results, it ends the SRAG graph with the no answer response instead of failing the request.
+    """
+    provider = get_search_provider()
+    cache = get_search_cache()
+    key = (provider.name, k, normalize_question(query))
+    results = cache.get(key)
+    if results is not None:
+        return results
+    try:
+        results = await asyncio.wait_for(provider.search(query, k), timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"Web search timed out after {timeout}s\n\nError id : LGR-WSR-21")
+        return []
+    except Exception as e:
+        logger.error(f"Error searching the web: {e}\n\nError id : LGR-WSR-22")
+        return []
+    cache.put(key, results)
+    return results
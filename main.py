@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi_routers.uploads import upload_link_doc as upl_doc_link
 from fastapi_routers.display import display as dply
@@ -5,8 +7,32 @@ from fastapi_routers.db import db_manager as db
 from fastapi_routers.Q_and_A import question_answering as q_a
 from fastapi_routers.Q_and_A import srag_q_a_web as srag
 from fastapi_routers.fine_tune_model import fine_tune_llm as ft
+from fastapi_routers.jobs import jobs
+from fastapi_routers.cache import cache
+from fastapi_routers.gateway import gateway
+from RAG_files.RAG_input_and_storage import resume_ingestion_jobs
+from langgraph_t.main import warm_up
+from util.db_manager import connect_db, init_db
+from util.executor import install_blocking_executor, shutdown_blocking_executor
+from util.job_queue import shutdown_executor
+from util.llm_gateway import shutdown_gateway
+
+
+@asynccontextmanager
+async def lifespan(app):
+    install_blocking_executor()  # Bound the threads used for SQLite, Chroma and file I/O off the event loop
+    init_db()  # Create and migrate the schema once instead of on the request path
+    sqlite_conn = connect_db()
+    resume_ingestion_jobs(sqlite_conn)  # Pick up ingestion jobs interrupted by the last shutdown
+    sqlite_conn.close()
+    warm_up()  # Build the LLM clients, chains and compiled SRAG graph before the first request
+    yield
+    shutdown_executor()
+    shutdown_gateway()
+    shutdown_blocking_executor()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get('/')
@@ -20,3 +46,6 @@ app.include_router(db.router)
 app.include_router(q_a.router)
 app.include_router(ft.router)
 app.include_router(srag.router)
+app.include_router(jobs.router)
+app.include_router(cache.router)
+app.include_router(gateway.router)
@@ -1,3 +1,3 @@
 CREATE TABLE IF NOT EXISTS file_references (id INTEGER PRIMARY KEY, title TEXT,
                                             file_name TEXT, web_link TEXT,
-                                            reference_id TEXT)
\ No newline at end of file
+                                            reference_id TEXT, content_hash TEXT)
\ No newline at end of file
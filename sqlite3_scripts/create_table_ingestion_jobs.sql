@@ -0,0 +1,3 @@
+CREATE TABLE IF NOT EXISTS ingestion_jobs (id TEXT PRIMARY KEY, kind TEXT, title TEXT, payload TEXT,
+                                           file_name TEXT, content_hash TEXT, status TEXT, stage TEXT, progress REAL,
+                                           result TEXT, error_id TEXT, created_at REAL, updated_at REAL)
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Bulk fetching and ingestion against a local stand-in web server; no network access or API key is used.
+
+Run with:
+    python -m pytest tests/test_bulk_ingestion.py
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import httpx
+
+from RAG_files import RAG_input_and_storage, web_fetcher
+from util.db_manager import create_db
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            PageHandler.in_flight += 1
+            PageHandler.max_in_flight = max(PageHandler.max_in_flight, PageHandler.in_flight)
+        try:
+            time.sleep(self.latency)
+            if self.path.startswith("/missing"):
+                self.send_error(404)
+                return
+            payload = (f"<html><body><h1 class='post-title'>{self.path}</h1>"
+                       f"<div class='post-content'>Content of {self.path}</div></body></html>").encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with self.lock:
+                PageHandler.in_flight -= 1
+
+
+class CountingConnection(sqlite3.Connection):
+    commits = 0
+
+    def commit(self):
+        self.commits += 1
+        super().commit()
+
+
+class BulkIngestionTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        PageHandler.in_flight = PageHandler.max_in_flight = 0
+        self.sqlite_conn = sqlite3.connect(":memory:", factory=CountingConnection)
+        create_db(self.sqlite_conn)
+        self.sqlite_conn.commits = 0
+        # Chunking and the vector store are not under test: keep pages whole and skip embedding
+        for name, replacement in (("chunk_documents", lambda documents, kind: documents),
+                                  ("get_embedding_function", mock.MagicMock),
+                                  ("store_chromadb", mock.MagicMock())):
+            patcher = mock.patch.object(RAG_input_and_storage, name, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.sqlite_conn.close()
+
+    def ingest(self, links):
+        return RAG_input_and_storage.ingest_bulk(links, [], self.sqlite_conn, client=httpx.AsyncClient())
+
+    def test_per_host_concurrency_limit(self):
+        links = [f"{self.base_url}/page-{i}" for i in range(8)]
+        with mock.patch.object(web_fetcher, "BULK_PER_HOST_CONCURRENCY", 2):
+            fetched = asyncio.run(web_fetcher.fetch_pages(links, client=httpx.AsyncClient()))
+        self.assertEqual(set(fetched), set(links))
+        self.assertTrue(all("Content of" in document.page_content for document in fetched.values()))
+        self.assertLessEqual(PageHandler.max_in_flight, 2)
+
+    def test_failed_pages_are_reported(self):
+        links = [{"title": "page", "data": f"{self.base_url}/page-1"},
+                 {"title": "missing", "data": f"{self.base_url}/missing"}]
+        results = {result["title"]: result for result in self.ingest(links)}
+        self.assertEqual(results["page"]["status"], "new")
+        self.assertEqual(results["missing"]["status"], "failed")
+        self.assertEqual(results["missing"]["error_id"], "RAG-BLK-88")
+        self.assertIsNone(results["missing"]["reference_id"])
+
+    def test_references_are_saved_in_one_transaction(self):
+        links = [{"title": f"page {i}", "data": f"{self.base_url}/page-{i}"} for i in range(5)]
+        results = self.ingest(links)
+        self.assertEqual(self.sqlite_conn.commits, 1)
+        rows = self.sqlite_conn.execute("SELECT title, reference_id FROM file_references").fetchall()
+        self.assertEqual(sorted(rows), sorted((result["title"], result["reference_id"]) for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Concurrent generation grading against stub graders; no API key or network access is used.
+
+Run with:
+    python -m pytest tests/test_generation_grading.py
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from langchain_core.documents import Document
+
+from langgraph_t import graph_route
+
+
+def stub_verdict(verdict, latency):
+    async def grade(*args, **kwargs):
+        await asyncio.sleep(latency)
+        return verdict
+    return grade
+
+
+class ConcurrentGradingTest(unittest.TestCase):
+
+    def grade(self, grounded, grounded_latency, useful, useful_latency):
+        state = {"question": "question", "documents": [Document(page_content="document")],
+                 "generation": "made up answer", "generations": 1, "best_generation": "earlier answer"}
+        config = {"configurable": {"generation_grader": "concurrent"}}
+        with mock.patch.object(graph_route, "hallucination_verdict", stub_verdict(grounded, grounded_latency)), \
+                mock.patch.object(graph_route, "answer_verdict", stub_verdict(useful, useful_latency)):
+            return asyncio.run(graph_route.grade_generation_v_documents_and_question(state, config))
+
+    def test_not_useful_before_grounding_is_known(self):
+        state = self.grade("no", 0.2, "no", 0.01)
+        self.assertEqual(state["verdict"], "not useful")
+        # The grounding check was cancelled, so the answer must not become the best generation
+        self.assertEqual(state["best_generation"], "earlier answer")
+
+    def test_not_grounded_first(self):
+        state = self.grade("no", 0.01, "yes", 0.2)
+        self.assertEqual(state["verdict"], "not supported")
+        self.assertEqual(state["best_generation"], "earlier answer")
+
+    def test_grounded_and_useful(self):
+        state = self.grade("yes", 0.01, "yes", 0.02)
+        self.assertEqual(state["verdict"], "useful")
+        self.assertEqual(state["best_generation"], "made up answer")
+
+    def test_grounded_but_not_useful(self):
+        state = self.grade("yes", 0.01, "no", 0.05)
+        self.assertEqual(state["verdict"], "not useful")
+        self.assertEqual(state["best_generation"], "made up answer")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from util.sqlite_pool import pooled_connect
+from util.vector_store_registry import get_embedding_function
+
+logger = logging.getLogger(__name__)
+
+# Location, size bound and freshness of the semantic answer cache
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "sqlite3_db/answer_cache.db")
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+# Minimum cosine similarity between a new question and a cached one to re-use its answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# Scope of answers generated by SRAG over the merged index of every collection
+GLOBAL_SCOPE = "srag_global"
+
+answer_cache = None
+answer_cache_lock = threading.Lock()
+
+
+class AnswerCache:
+    """
+    SQLite backed store of answers keyed by scope and question embedding, with TTL and LRU eviction.
+
+    A scope is a reference ID (answers over one collection) or GLOBAL_SCOPE. Entries live in SQLite so
+    that invalidations made by ingestion workers in other processes are seen by the API process.
+    """
+
+    def __init__(self, path, max_entries, ttl, threshold):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        sqlite_conn = pooled_connect(path)
+        try:
+            sqlite_conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY, scope TEXT, question TEXT, "
+                "vector BLOB, answer TEXT, created REAL, last_access REAL)"
+            )
+            sqlite_conn.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope)")
+            sqlite_conn.execute("CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access)")
+            sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
+
+    def embed(self, question):
+        # Goes through the embedding cache, so a question is only sent to the provider once
+        return np.asarray(get_embedding_function().embed_query(question), dtype=np.float32)
+
+    def lookup(self, scope, question):
+        """
+        Return the answer of the most similar fresh question of the scope, or None below the threshold.
+        """
+        vector = self.embed(question)
+        now = time.time()
+        sqlite_conn = pooled_connect(self.path)
+        try:
+            # Expired entries of the scope are dropped on the way
+            sqlite_conn.execute("DELETE FROM answers WHERE scope=? AND created<?", (scope, now - self.ttl))
+            rows = sqlite_conn.execute("SELECT id, vector, answer FROM answers WHERE scope=?", (scope,)).fetchall()
+            answer = None
+            if rows:
+                matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                similarities = matrix @ vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector) + 1e-12)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    answer = rows[best][2]
+                    sqlite_conn.execute("UPDATE answers SET last_access=? WHERE id=?", (now, rows[best][0]))
+            sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
+        with self.lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return answer
+
+    def store(self, scope, question, answer):
+        """
+        Remember the answer to a question and evict the least recently used entries above the size bound.
+        """
+        vector = self.embed(question)
+        now = time.time()
+        sqlite_conn = pooled_connect(self.path)
+        try:
+            sqlite_conn.execute(
+                "INSERT INTO answers (scope, question, vector, answer, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, question, vector.tobytes(), answer, now, now))
+            count = sqlite_conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            if count > self.max_entries:
+                sqlite_conn.execute(
+                    "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,))
+            sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
+
+    def invalidate(self, scopes):
+        """
+        Drop every answer of the given scopes.
+        """
+        sqlite_conn = pooled_connect(self.path)
+        try:
+            sqlite_conn.executemany("DELETE FROM answers WHERE scope=?", [(scope,) for scope in scopes])
+            sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
+
+    def clear(self):
+        """
+        Drop every cached answer.
+        """
+        sqlite_conn = pooled_connect(self.path)
+        try:
+            sqlite_conn.execute("DELETE FROM answers")
+            sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
+
+    def stats(self):
+        """
+        Hit/miss counters of this process and the number of stored answers.
+        """
+        sqlite_conn = pooled_connect(self.path)
+        try:
+            entries = sqlite_conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        finally:
+            sqlite_conn.close()
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries}
+
+
+def get_answer_cache():
+    """
+    Return the process-wide answer cache, opening it on first use.
+    """
+    global answer_cache
+    with answer_cache_lock:
+        if answer_cache is None:
+            answer_cache = AnswerCache(ANSWER_CACHE_PATH, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL,
+                                       ANSWER_CACHE_THRESHOLD)
+    return answer_cache
+
+
+def lookup_answer(scope, question):
+    """
+    Return a cached answer to a similar question of the scope, or None. Cache failures count as misses.
+    """
+    try:
+        return get_answer_cache().lookup(scope, question)
+    except Exception as e:
+        logger.error(f"Error looking up the answer cache: {e}\n\nError id : RAG-ACH-31")
+        return None
+
+
+def store_answer(scope, question, answer):
+    """
+    Cache the answer to a question of the scope; failures only cost a future cache hit.
+    """
+    try:
+        get_answer_cache().store(scope, question, answer)
+    except Exception as e:
+        logger.error(f"Error storing in the answer cache: {e}\n\nError id : RAG-ACH-32")
+
+
+def invalidate_answers(*scopes):
+    """
+    Forget the cached answers of collections whose content changed.
+    """
+    get_answer_cache().invalidate(scopes)
+
+
+def clear_answers():
+    """
+    Forget every cached answer.
+    """
+    get_answer_cache().clear()
@@ -1,27 +1,40 @@
-import os
-import shutil
-import sqlite3
 import logging
 import sys
-from langchain_community.vectorstores import Chroma
-import chromadb
+from util.vector_store_registry import delete_collection, delete_all_collections
+from RAG_files.global_index import remove_from_global_index
+from RAG_files.inverted_index import remove_collection, clear_index
+from util.answer_cache import invalidate_answers, clear_answers, GLOBAL_SCOPE
+from util.job_queue import create_jobs_table
+from util.sqlite_pool import pooled_connect
 
 logger = logging.getLogger(__name__)
 
+DATABASE_PATH = "sqlite3_db/file_references.db"
+
 
 def connect_db():
     """
-    Connect to the SQLite database. If it doesn't exist, it will be created.
+    Check out a pooled connection to the SQLite database. If it doesn't exist, it will be created.
+    Calling close() on the connection returns it to the pool.
     """
-    # Set up SQLite database for file references
-    sqlite_conn = sqlite3.connect("sqlite3_db/file_references.db")
-    sqlite_conn.commit()
-    return sqlite_conn
+    # WAL journaling, tuned pragmas and statement caching are set up once per pooled connection
+    return pooled_connect(DATABASE_PATH)
+
+
+def init_db():
+    """
+    Create and migrate the schema once, at application startup.
+    """
+    sqlite_conn = connect_db()
+    try:
+        create_db(sqlite_conn)
+    finally:
+        sqlite_conn.close()
 
 
 def create_db(sqlite_conn):
     """
-    Create the file_references table if it doesn't exist.
+    Create the file_references and ingestion_jobs tables if they don't exist.
     """
     try:
         sqlite_cursor = sqlite_conn.cursor()
@@ -29,15 +42,63 @@ def create_db(sqlite_conn):
         sqlite_cursor.execute(
             "CREATE TABLE IF NOT EXISTS file_references (id INTEGER PRIMARY KEY, title TEXT, file_name TEXT, "
             "web_link TEXT,"
-            "reference_id TEXT)"
+            "reference_id TEXT, content_hash TEXT)"
         )
+        # Databases created before content hashing was introduced lack the content_hash column
+        add_missing_columns(sqlite_conn, "file_references", {"content_hash": "TEXT"})
+        sqlite_cursor.execute(
+            "CREATE INDEX IF NOT EXISTS file_references_content_hash ON file_references (content_hash)")
         sqlite_conn.commit()
+        # Background ingestion jobs live next to the file references
+        create_jobs_table(sqlite_conn)
+        add_missing_columns(sqlite_conn, "ingestion_jobs", {"content_hash": "TEXT"})
     except Exception:
         logger.exception("Error creating the table ")
         sqlite_conn.close()
         sys.exit(1)  # Exit the program if the table creation fails
 
 
+def add_missing_columns(sqlite_conn, table, columns):
+    """
+    Add the given {name: type} columns to an existing table when they are missing.
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in sqlite_cursor.fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            sqlite_cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+    sqlite_conn.commit()
+
+
+def find_reference_by_hash(sqlite_conn, content_hash):
+    """
+    Return the reference ID of already indexed content with the given SHA-256 digest, or None.
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute("SELECT reference_id FROM file_references WHERE content_hash=? LIMIT 1", (content_hash,))
+    row = sqlite_cursor.fetchone()
+    return row[0] if row else None
+
+
+def find_reference_ids(sqlite_conn, reference_ids=None, title=None):
+    """
+    Return the stored reference IDs among the given ones and/or those whose title contains the filter text.
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    found = []
+    if reference_ids:
+        placeholders = ", ".join("?" * len(reference_ids))
+        sqlite_cursor.execute(f"SELECT DISTINCT reference_id FROM file_references WHERE reference_id IN ({placeholders})",
+                              list(reference_ids))
+        found.extend(row[0] for row in sqlite_cursor.fetchall())
+    if title:
+        sqlite_cursor.execute("SELECT DISTINCT reference_id FROM file_references WHERE title LIKE ?", (f"%{title}%",))
+        found.extend(row[0] for row in sqlite_cursor.fetchall())
+    # Fine-tuning entries have no collection to search
+    return [reference_id for reference_id in dict.fromkeys(found) if "file" not in reference_id]
+
+
 def reset_db(sqlite_conn):
     """
     Reset the database by deleting all entries and their associated vector store collections.
@@ -48,20 +109,12 @@ def reset_db(sqlite_conn):
         sqlite_cursor.execute("DELETE FROM file_references")
         sqlite_conn.commit()
 
-        ref_ids = []
-        # Retrieve all records to get the reference IDs
-        sqlite_cursor.execute("SELECT id, title, file_name, web_link, reference_id FROM file_references")
-        rows = sqlite_cursor.fetchall()
-
-        for row in rows:
-            ref_ids.extend(row[4])
-
-        # Delete corresponding collections in the vector store
-        for ref_id in ref_ids:
-            vector_store = Chroma(persist_directory="chromadb_persist", collection_name=f"document_embeddings_{ref_id}")
-            vector_store.delete_collection()
-
-        shutil.rmtree("chromadb_persist")
+        # Delete every collection (including the merged SRAG index) through the shared client, which also
+        # drops the cached collection handles; removing chromadb_persist under a live client would corrupt it
+        delete_all_collections()
+        clear_index()
+        # Every cached answer was generated from the deleted content
+        clear_answers()
 
         return {"result": "Database reset successfully"}
     except Exception as e:
@@ -97,13 +150,18 @@ def delete_entry_from_db(index, sqlite_conn):
         # Retrieve the reference ID of the entry to be deleted
         sqlite_cursor.execute("SELECT reference_id FROM file_references WHERE id=?", (index,))
         ref_id = sqlite_cursor.fetchone()
-
-
-        # Delete the corresponding collection in the vector store
-        # vector_store = chromadb.PersistentClient(path="chromadb_persist")
-        # vector_store.delete_collection(name=f"document_embeddings_{ref_id[0]}")
-        vector_store = Chroma(persist_directory="chromadb_persist",collection_name=f"document_embeddings_{ref_id[0]}")
-        vector_store.delete_collection()
+        # Deduplicated uploads share a reference ID, so only drop the vectors with its last entry
+        sqlite_cursor.execute("SELECT COUNT(*) FROM file_references WHERE reference_id=?", (ref_id[0],))
+        shared = sqlite_cursor.fetchone()[0] > 1
+
+        if not shared:
+            # Delete the corresponding collection in the vector store and its cached handle
+            delete_collection(f"document_embeddings_{ref_id[0]}")
+            remove_collection(f"document_embeddings_{ref_id[0]}")
+            # Drop the same chunks from the merged SRAG index
+            remove_from_global_index(ref_id[0])
+            # Cached answers may quote the removed content
+            invalidate_answers(ref_id[0], GLOBAL_SCOPE)
 
         # Delete the record from the table
         sqlite_cursor.execute("DELETE FROM file_references WHERE id=?", (index,))
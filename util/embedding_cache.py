@@ -0,0 +1,198 @@
+import array
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from util.llm_clients import get_embedding_model
+from util.llm_gateway import BatchedEmbeddings, EMBEDDING_GATEWAY
+from util.sqlite_pool import pooled_connect
+
+logger = logging.getLogger(__name__)
+
+# Location and size bound of the on-disk embedding cache
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "sqlite3_db/embedding_cache.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+# Seconds between two evictions; counting the table on every insert costs a scan of the whole cache
+EMBEDDING_CACHE_SWEEP_INTERVAL = 60
+
+embedding_cache = None
+embedding_cache_lock = threading.Lock()
+
+
+def hash_text(text):
+    """
+    Content address of a chunk of text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite backed store of embeddings keyed by (model, sha256 of the text) with LRU eviction.
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.last_sweep = 0.0
+        self.lock = threading.Lock()
+        sqlite_conn = pooled_connect(path)
+        try:
+            sqlite_conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (model TEXT, text_hash TEXT, vector BLOB, last_access REAL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+            sqlite_conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+            sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
+
+    def get_many(self, model, text_hashes):
+        """
+        Return the cached vectors for the given hashes and mark them as recently used.
+        """
+        found = {}
+        sqlite_conn = pooled_connect(self.path)
+        try:
+            sqlite_cursor = sqlite_conn.cursor()
+            for text_hash in set(text_hashes):
+                sqlite_cursor.execute("SELECT vector FROM embeddings WHERE model=? AND text_hash=?",
+                                      (model, text_hash))
+                row = sqlite_cursor.fetchone()
+                if row:
+                    found[text_hash] = array.array("f", row[0]).tolist()
+            if found:
+                now = time.time()
+                sqlite_cursor.executemany("UPDATE embeddings SET last_access=? WHERE model=? AND text_hash=?",
+                                          [(now, model, text_hash) for text_hash in found])
+                sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
+        with self.lock:
+            self.hits += sum(1 for text_hash in text_hashes if text_hash in found)
+            self.misses += sum(1 for text_hash in text_hashes if text_hash not in found)
+        return found
+
+    def sweep(self, sqlite_conn):
+        """
+        Evict the least recently used vectors above the size bound, at most once per sweep interval.
+        """
+        now = time.time()
+        with self.lock:
+            if now - self.last_sweep < EMBEDDING_CACHE_SWEEP_INTERVAL:
+                return
+            self.last_sweep = now
+        count = sqlite_conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_entries:
+            sqlite_conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_access LIMIT ?)", (count - self.max_entries,))
+
+    def put_many(self, model, vectors_by_hash):
+        """
+        Store freshly computed vectors; the cache may exceed its size bound until the next sweep.
+        """
+        if not vectors_by_hash:
+            return
+        now = time.time()
+        sqlite_conn = pooled_connect(self.path)
+        try:
+            sqlite_conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                [(model, text_hash, array.array("f", vector).tobytes(), now)
+                 for text_hash, vector in vectors_by_hash.items()])
+            self.sweep(sqlite_conn)
+            sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
+
+    def stats(self):
+        """
+        Hit/miss counters of this process.
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only sends texts missing from the embedding cache to the provider.
+    """
+
+    def __init__(self, underlying, cache):
+        self.underlying = underlying
+        self.cache = cache
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+
+    def _split(self, texts):
+        text_hashes = [hash_text(text) for text in texts]
+        found = self.cache.get_many(self.model, text_hashes)
+        # Embed each distinct missing text only once
+        missing = {}
+        for text, text_hash in zip(texts, text_hashes):
+            if text_hash not in found:
+                missing.setdefault(text_hash, text)
+        return text_hashes, found, missing
+
+    def embed_documents(self, texts):
+        text_hashes, found, missing = self._split(texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model, computed)
+            found.update(computed)
+        return [found[text_hash] for text_hash in text_hashes]
+
+    def embed_query(self, text):
+        text_hashes, found, missing = self._split([text])
+        if missing:
+            vector = self.underlying.embed_query(text)
+            self.cache.put_many(self.model, {text_hashes[0]: vector})
+            return vector
+        return found[text_hashes[0]]
+
+    async def aembed_documents(self, texts):
+        text_hashes, found, missing = self._split(texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model, computed)
+            found.update(computed)
+        return [found[text_hash] for text_hash in text_hashes]
+
+    async def aembed_query(self, text):
+        text_hashes, found, missing = self._split([text])
+        if missing:
+            vector = await self.underlying.aembed_query(text)
+            self.cache.put_many(self.model, {text_hashes[0]: vector})
+            return vector
+        return found[text_hashes[0]]
+
+
+def get_embedding_cache():
+    """
+    Return the process-wide embedding cache, opening it on first use.
+    """
+    global embedding_cache
+    with embedding_cache_lock:
+        if embedding_cache is None:
+            embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+    return embedding_cache
+
+
+def get_embeddings():
+    """
+    Return an OpenAI embedding function that goes through the shared embedding cache.
+
+    With EMBEDDING_GATEWAY on, query embeddings missing from the cache are batched across requests.
+    """
+    underlying = get_embedding_model()
+    if EMBEDDING_GATEWAY:
+        underlying = BatchedEmbeddings(underlying)
+    return CachedEmbeddings(underlying, get_embedding_cache())
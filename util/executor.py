@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+# Threads available to blocking work (SQLite, Chroma, file I/O) started from the event loop
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "32"))
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_blocking_executor():
+    """
+    Return the bounded thread pool that runs blocking calls on behalf of the event loop.
+    """
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+    return executor
+
+
+def install_blocking_executor():
+    """
+    Make the bounded pool the running loop's default executor.
+
+    LangChain offloads sync-only steps (e.g. Chroma similarity search) to the default executor,
+    so this keeps them within the same bound as run_blocking.
+    """
+    asyncio.get_running_loop().set_default_executor(get_blocking_executor())
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking function in the bounded pool without stalling the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_blocking_executor(), partial(func, *args, **kwargs))
+
+
+def shutdown_blocking_executor():
+    """
+    Stop the blocking pool, waiting for running calls to finish.
+    """
+    global executor
+    with executor_lock:
+        if executor is not None:
+            executor.shutdown(wait=True)
+            executor = None
@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from util.llm_scheduler import priority_class
+
+logger = logging.getLogger(__name__)
+
+# Worker pool configuration: "thread" or "process" workers and how many of them
+INGESTION_WORKER_MODE = os.getenv("INGESTION_WORKER_MODE", "thread")
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+# Seconds without progress after which a running job is considered abandoned (e.g. its worker died)
+INGESTION_JOB_LEASE = float(os.getenv("INGESTION_JOB_LEASE", "600"))
+
+JOB_COLUMNS = ("id", "kind", "title", "payload", "file_name", "content_hash", "status", "stage", "progress", "result",
+               "error_id", "created_at", "updated_at")
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def create_jobs_table(sqlite_conn):
+    """
+    Create the ingestion_jobs table if it doesn't exist.
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(
+        "CREATE TABLE IF NOT EXISTS ingestion_jobs (id TEXT PRIMARY KEY, kind TEXT, title TEXT, payload TEXT, "
+        "file_name TEXT, content_hash TEXT, status TEXT, stage TEXT, progress REAL, result TEXT, error_id TEXT, created_at REAL, "
+        "updated_at REAL)"
+    )
+    sqlite_conn.commit()
+
+
+def get_executor():
+    """
+    Return the ingestion worker pool, creating it on first use.
+    """
+    global executor
+    with executor_lock:
+        if executor is None:
+            if INGESTION_WORKER_MODE == "process":
+                executor = ProcessPoolExecutor(max_workers=INGESTION_WORKERS)
+            else:
+                executor = ThreadPoolExecutor(max_workers=INGESTION_WORKERS, thread_name_prefix="ingestion")
+    return executor
+
+
+def shutdown_executor():
+    """
+    Stop the ingestion worker pool; unfinished jobs are resumed on the next start.
+    """
+    global executor
+    with executor_lock:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = None
+
+
+def create_job(sqlite_conn, kind, title, payload, file_name=None, content_hash=None):
+    """
+    Insert a queued ingestion job and return its id.
+    """
+    job_id = str(uuid.uuid4())
+    now = time.time()
+    sqlite_conn.execute(
+        "INSERT INTO ingestion_jobs (id, kind, title, payload, file_name, content_hash, status, stage, progress, "
+        "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', 'queued', 0.0, ?, ?)",
+        (job_id, kind, title, payload, file_name, content_hash, now, now))
+    sqlite_conn.commit()
+    return job_id
+
+
+def update_job(sqlite_conn, job_id, **fields):
+    """
+    Update the given columns of an ingestion job.
+    """
+    if "result" in fields and fields["result"] is not None:
+        fields["result"] = json.dumps(fields["result"])
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{column}=?" for column in fields if column in JOB_COLUMNS)
+    values = [value for column, value in fields.items() if column in JOB_COLUMNS]
+    sqlite_conn.execute(f"UPDATE ingestion_jobs SET {assignments} WHERE id=?", (*values, job_id))
+    sqlite_conn.commit()
+
+
+def get_job(sqlite_conn, job_id):
+    """
+    Return an ingestion job as a dictionary, or None if it doesn't exist.
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM ingestion_jobs WHERE id=?", (job_id,))
+    row = sqlite_cursor.fetchone()
+    if row is None:
+        return None
+    job = dict(zip(JOB_COLUMNS, row))
+    if job["result"]:
+        job["result"] = json.loads(job["result"])
+    return job
+
+
+def claim_job(sqlite_conn, job_id):
+    """
+    Atomically move a queued job to running; returns False when another worker has already claimed it.
+    """
+    now = time.time()
+    sqlite_cursor = sqlite_conn.execute(
+        "UPDATE ingestion_jobs SET status='running', stage='started', progress=0.0, updated_at=? "
+        "WHERE id=? AND status='queued'", (now, job_id))
+    sqlite_conn.commit()
+    return sqlite_cursor.rowcount == 1
+
+
+def has_earlier_pending_job(sqlite_conn, job_id, content_hash):
+    """
+    Whether a file job with the same content, queued before the given job, is still queued or running.
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(
+        "SELECT 1 FROM ingestion_jobs WHERE kind='file' AND content_hash=? AND status IN ('queued', 'running') "
+        "AND rowid<(SELECT rowid FROM ingestion_jobs WHERE id=?) LIMIT 1", (content_hash, job_id))
+    return sqlite_cursor.fetchone() is not None
+
+
+def get_waiting_job_ids(sqlite_conn, job_id, content_hash):
+    """
+    Return the ids of queued file jobs with the same content as the given job, oldest first.
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute("SELECT id FROM ingestion_jobs WHERE kind='file' AND content_hash=? AND status='queued' "
+                          "AND id<>? ORDER BY rowid", (content_hash, job_id))
+    return [row[0] for row in sqlite_cursor.fetchall()]
+
+
+def get_unfinished_job_ids(sqlite_conn):
+    """
+    Return the ids of queued jobs, first re-queueing running jobs whose lease has expired.
+
+    A running job renews its lease with every progress update, so jobs that a live worker (of this or
+    another server process) is processing are left alone.
+    """
+    sqlite_conn.execute("UPDATE ingestion_jobs SET status='queued', stage='queued' WHERE status='running' AND "
+                        "updated_at<?", (time.time() - INGESTION_JOB_LEASE,))
+    sqlite_conn.commit()
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute("SELECT id FROM ingestion_jobs WHERE status='queued' ORDER BY created_at")
+    return [row[0] for row in sqlite_cursor.fetchall()]
+
+
+def submit_job(runner, job_id):
+    """
+    Hand a job to the worker pool; runner must be a top-level function so process workers can pickle it.
+    """
+    future = get_executor().submit(run_in_background, runner, job_id)
+    future.add_done_callback(lambda done: log_job_crash(done, job_id))
+    return future
+
+
+def run_in_background(runner, job_id):
+    # Ingestion embeddings yield the LLM rate limits to the requests of waiting users
+    with priority_class("background"):
+        return runner(job_id)
+
+
+def log_job_crash(future, job_id):
+    """
+    Log errors that escaped the job runner itself (e.g. a worker process dying).
+    """
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Ingestion job {job_id} crashed: {error}\n\nError id : RAG-JOB-21")
@@ -0,0 +1,82 @@
+import logging
+import os
+import threading
+
+import httpx
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from util.llm_scheduler import AsyncRateLimitedTransport, RateLimitedTransport
+
+logger = logging.getLogger(__name__)
+
+# Connection pool shared by every OpenAI chat and embeddings client of the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+http_client = None
+async_http_client = None
+chat_models = {}
+embedding_model = None
+clients_lock = threading.Lock()
+
+
+def http_limits():
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+
+
+def get_http_client():
+    """
+    Return the keep-alive HTTP client shared by synchronous OpenAI calls; its transport applies the
+    process-wide rate limits and retries.
+    """
+    global http_client
+    with clients_lock:
+        if http_client is None:
+            http_client = httpx.Client(transport=RateLimitedTransport(httpx.HTTPTransport(limits=http_limits())),
+                                       timeout=LLM_TIMEOUT)
+    return http_client
+
+
+def get_async_http_client():
+    """
+    Return the keep-alive HTTP client shared by asynchronous OpenAI calls.
+    """
+    global async_http_client
+    with clients_lock:
+        if async_http_client is None:
+            async_http_client = httpx.AsyncClient(
+                transport=AsyncRateLimitedTransport(httpx.AsyncHTTPTransport(limits=http_limits())),
+                timeout=LLM_TIMEOUT)
+    return async_http_client
+
+
+def get_chat_model(model="gpt-3.5-turbo", temperature=None):
+    """
+    Return the process-wide ChatOpenAI client for a model and temperature.
+
+    The client is stateless between calls, so the same instance is safely shared by concurrent requests.
+    Retries are left to the shared transport, which backs off for the whole process.
+    """
+    key = (model, temperature)
+    with clients_lock:
+        if key in chat_models:
+            return chat_models[key]
+    kwargs = {} if temperature is None else {"temperature": temperature}
+    chat_model = ChatOpenAI(model=model, http_client=get_http_client(), http_async_client=get_async_http_client(),
+                            max_retries=0, **kwargs)
+    with clients_lock:
+        return chat_models.setdefault(key, chat_model)
+
+
+def get_embedding_model():
+    """
+    Return the process-wide OpenAIEmbeddings client, on the same connection pool and rate limits as the chat clients.
+    """
+    global embedding_model
+    if embedding_model is None:
+        embeddings = OpenAIEmbeddings(http_client=get_http_client(), http_async_client=get_async_http_client(),
+                                      max_retries=0)
+        with clients_lock:
+            if embedding_model is None:
+                embedding_model = embeddings
+    return embedding_model
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Window in milliseconds during which independent calls are collected into one batch
+GATEWAY_MAX_WAIT_MS = float(os.getenv("GATEWAY_MAX_WAIT_MS", "10"))
+# Largest batches sent upstream; a full batch is sent without waiting for the end of the window
+GATEWAY_EMBED_BATCH_SIZE = int(os.getenv("GATEWAY_EMBED_BATCH_SIZE", "256"))
+GATEWAY_GRADE_BATCH_SIZE = int(os.getenv("GATEWAY_GRADE_BATCH_SIZE", "16"))
+# Batches of the same kind in flight at once
+GATEWAY_DISPATCH_WORKERS = int(os.getenv("GATEWAY_DISPATCH_WORKERS", "8"))
+# Send single-query embeddings through the gateway ("on" or "off")
+EMBEDDING_GATEWAY = os.getenv("EMBEDDING_GATEWAY", "off") == "on"
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_WAIT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+batchers = {}
+batchers_lock = threading.Lock()
+
+
+class Histogram:
+    """
+    Counts of recorded values per bucket; a bucket holds the values up to its bound.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self):
+        with self.lock:
+            buckets = {f"<={bound}": count for bound, count in zip(self.bounds, self.counts)}
+            buckets[f">{self.bounds[-1]}"] = self.counts[-1]
+            return {"count": self.count, "mean": round(self.total / self.count, 3) if self.count else 0.0,
+                    "buckets": buckets}
+
+
+class MicroBatcher:
+    """
+    Collect independent calls for up to max_wait seconds (or max_batch_size calls) and pass them to
+    the batch function as one list; each caller gets the result at its position.
+
+    Callers may be threads (call) or coroutines (acall). Batches are sent from a small pool, so a slow
+    batch does not hold up the collection of the next one.
+    """
+
+    def __init__(self, name, batch_function, max_batch_size, max_wait=GATEWAY_MAX_WAIT_MS / 1000):
+        self.name = name
+        self.batch_function = batch_function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_waits = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.collector = None
+        self.dispatcher = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.collector is None:
+                self.dispatcher = ThreadPoolExecutor(max_workers=GATEWAY_DISPATCH_WORKERS,
+                                                     thread_name_prefix=f"gateway-{self.name}")
+                self.collector = threading.Thread(target=self.collect, name=f"gateway-{self.name}", daemon=True)
+                self.collector.start()
+
+    def submit(self, item):
+        future = Future()
+        self.start()
+        self.queue.put((time.monotonic(), item, future))
+        return future
+
+    def call(self, item):
+        return self.submit(item).result()
+
+    async def acall(self, item):
+        return await asyncio.wrap_future(self.submit(item))
+
+    def collect(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = [first]
+            # The window starts when the first call of the batch arrived
+            deadline = first[0] + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self.dispatcher.submit(self.dispatch, batch)
+            if stopping:
+                return
+
+    def dispatch(self, batch):
+        now = time.monotonic()
+        # Callers that gave up (e.g. a cancelled request) are left out of the batch
+        batch = [(enqueued, item, future) for enqueued, item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        self.batch_sizes.record(len(batch))
+        for enqueued, _, _ in batch:
+            self.queue_waits.record((now - enqueued) * 1000)
+        try:
+            results = self.batch_function([item for _, item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"{len(results)} results for a batch of {len(batch)}")
+        except Exception as e:
+            logger.error(f"Error sending a {self.name} batch: {e}\n\nError id : RAG-GTW-71")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        """
+        Batch-size and queue-wait (milliseconds) histograms of this process.
+        """
+        return {"batch_size": self.batch_sizes.snapshot(), "queue_wait_ms": self.queue_waits.snapshot()}
+
+    def shutdown(self):
+        with self.lock:
+            if self.collector is not None:
+                self.queue.put(None)
+                self.collector.join()
+                self.dispatcher.shutdown(wait=True)
+                self.collector = None
+                self.dispatcher = None
+
+
+def get_batcher(name, batch_function, max_batch_size):
+    """
+    Return the process-wide batcher of a kind of call, creating it on first use.
+    """
+    with batchers_lock:
+        if name not in batchers:
+            batchers[name] = MicroBatcher(name, batch_function, max_batch_size)
+        return batchers[name]
+
+
+def gateway_stats():
+    with batchers_lock:
+        return {name: batcher.stats() for name, batcher in batchers.items()}
+
+
+def shutdown_gateway():
+    """
+    Send the batches being collected and stop the gateway threads.
+    """
+    with batchers_lock:
+        for batcher in batchers.values():
+            batcher.shutdown()
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings whose single-query calls go through the gateway, so concurrent queries share one request.
+
+    Document embeddings are already sent in batches and go straight to the underlying client.
+    """
+
+    def __init__(self, underlying, max_batch_size=GATEWAY_EMBED_BATCH_SIZE):
+        self.underlying = underlying
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+        self.batcher = get_batcher("embeddings", underlying.embed_documents, max_batch_size)
+
+    def embed_documents(self, texts):
+        return self.underlying.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.underlying.aembed_documents(texts)
+
+    def embed_query(self, text):
+        return self.batcher.call(text)
+
+    async def aembed_query(self, text):
+        return await self.batcher.acall(text)
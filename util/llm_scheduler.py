@@ -0,0 +1,295 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from util.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Requests and tokens per minute allowed per model; models not listed (or fine-tuned from a listed one) use the defaults
+LLM_RATE_LIMITS = json.loads(os.getenv(
+    "LLM_RATE_LIMITS",
+    '{"gpt-3.5-turbo": {"rpm": 3500, "tpm": 160000}, "gpt-4o": {"rpm": 500, "tpm": 30000}, '
+    '"text-embedding-ada-002": {"rpm": 3000, "tpm": 1000000}}'
+))
+LLM_DEFAULT_RPM = int(os.getenv("LLM_DEFAULT_RPM", "500"))
+LLM_DEFAULT_TPM = int(os.getenv("LLM_DEFAULT_TPM", "60000"))
+# Share of every bucket that background work (ingestion) leaves to interactive requests
+LLM_INTERACTIVE_RESERVE = float(os.getenv("LLM_INTERACTIVE_RESERVE", "0.2"))
+# Retries of rate-limited or failed calls, with exponential backoff and full jitter
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+# Completion tokens assumed for a chat call that does not set max_tokens
+LLM_COMPLETION_ESTIMATE = int(os.getenv("LLM_COMPLETION_ESTIMATE", "256"))
+
+# Calls that are scheduled and retried; other API calls (files, fine-tuning jobs) pass through as they are
+SCHEDULED_PATHS = ("/chat/completions", "/embeddings")
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Connection failures, timeouts and dropped connections, retried like the OpenAI client did before
+RETRY_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+# "interactive" calls serve a waiting user, "background" calls (ingestion) only use what they leave
+llm_priority = contextvars.ContextVar("llm_priority", default="interactive")
+
+limiters = {}
+limiters_lock = threading.Lock()
+
+
+@contextmanager
+def priority_class(name):
+    """
+    Run the LLM calls made inside the block (in this thread or task) with the given priority.
+    """
+    token = llm_priority.set(name)
+    try:
+        yield
+    finally:
+        llm_priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Bucket holding up to one minute of a rate, refilled continuously.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.rate = self.capacity / 60
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, floor=0.0):
+        """
+        Seconds until the amount can be taken while leaving the floor in the bucket.
+        """
+        # A call larger than the bucket waits for a full bucket and then runs into debt
+        needed = min(amount, self.capacity - floor) + floor
+        return max(0.0, (needed - self.level) / self.rate)
+
+    def take(self, amount):
+        self.level -= amount
+
+
+class ModelLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets of one model, shared by every client of the process.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens, priority):
+        """
+        Take one request and the estimated tokens, or return the seconds to wait before trying again.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            reserve = LLM_INTERACTIVE_RESERVE if priority == "background" else 0.0
+            wait = max(self.requests.wait_time(1, self.requests.capacity * reserve),
+                       self.tokens.wait_time(tokens, self.tokens.capacity * reserve))
+            if wait == 0:
+                self.requests.take(1)
+                self.tokens.take(tokens)
+            return wait
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+
+    def record_retry(self, status_code, delay):
+        with self.lock:
+            self.retries += 1
+            if status_code == 429:
+                # The provider says the whole process is over its limit: hold every call to the model
+                self.rate_limited += 1
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def stats(self):
+        with self.lock:
+            return {"waits": self.waits, "wait_seconds": round(self.wait_seconds, 3), "retries": self.retries,
+                    "rate_limited": self.rate_limited}
+
+
+def get_limiter(model):
+    with limiters_lock:
+        if model not in limiters:
+            # Fine-tuned models ("ft:gpt-3.5-turbo-0125:org::id") share the limits of their base model
+            base = model.split(":")[1] if model.startswith("ft:") else model
+            limits = LLM_RATE_LIMITS.get(base) or next(
+                (value for name, value in LLM_RATE_LIMITS.items() if base.startswith(name)), {})
+            limiters[model] = ModelLimiter(limits.get("rpm", LLM_DEFAULT_RPM), limits.get("tpm", LLM_DEFAULT_TPM))
+        return limiters[model]
+
+
+def scheduler_stats():
+    """
+    Waits and retries per model of this process.
+    """
+    with limiters_lock:
+        return {model: limiter.stats() for model, limiter in limiters.items()}
+
+
+def estimate_tokens(body):
+    """
+    Tokens a chat or embeddings request body is expected to use.
+    """
+    if "messages" in body:
+        prompt = sum(count_tokens(str(message.get("content") or "")) for message in body["messages"])
+        return prompt + (body.get("max_tokens") or LLM_COMPLETION_ESTIMATE)
+    inputs = body.get("input", [])
+    if isinstance(inputs, str):
+        return count_tokens(inputs)
+    # Embedding inputs are strings or, once split to the context length, lists of token ids
+    return sum(len(item) if isinstance(item, list) else count_tokens(str(item)) for item in inputs)
+
+
+def scheduled_call(request):
+    """
+    Return the limiter and estimated tokens of a call to schedule, or None for calls passed through.
+    """
+    if not request.url.path.endswith(SCHEDULED_PATHS):
+        return None
+    try:
+        body = json.loads(request.content)
+    except (ValueError, httpx.RequestNotRead):
+        return None
+    return get_limiter(body.get("model", "")), estimate_tokens(body)
+
+
+def backoff_delay(attempt, response=None):
+    """
+    Exponential backoff with full jitter, and at least what the provider asks for in Retry-After.
+    """
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    if response is not None:
+        try:
+            if "retry-after-ms" in response.headers:
+                delay = max(delay, float(response.headers["retry-after-ms"]) / 1000)
+            elif "retry-after" in response.headers:
+                delay = max(delay, float(response.headers["retry-after"]))
+        except ValueError:
+            pass
+    return min(delay, LLM_BACKOFF_MAX)
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """
+    Transport of the shared OpenAI HTTP client: waits for the model's rate limits before each chat or
+    embeddings call and retries rate-limited and failed calls with backoff, so concurrent chains back off
+    together instead of retrying on their own.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def acquire(self, limiter, tokens):
+        priority = llm_priority.get()
+        waited = 0.0
+        while True:
+            wait = limiter.try_acquire(tokens, priority)
+            if wait == 0:
+                break
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            limiter.record_wait(waited)
+
+    def handle_request(self, request):
+        call = scheduled_call(request)
+        if call is None:
+            return self.transport.handle_request(request)
+        limiter, tokens = call
+        attempt = 0
+        while True:
+            self.acquire(limiter, tokens)
+            try:
+                response = self.transport.handle_request(request)
+            except RETRY_ERRORS:
+                if attempt >= LLM_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt)
+                limiter.record_retry(None, delay)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= LLM_MAX_RETRIES:
+                    return response
+                delay = backoff_delay(attempt, response)
+                limiter.record_retry(response.status_code, delay)
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Asynchronous counterpart of RateLimitedTransport, sharing the same per-model limiters.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def acquire(self, limiter, tokens):
+        priority = llm_priority.get()
+        waited = 0.0
+        while True:
+            wait = limiter.try_acquire(tokens, priority)
+            if wait == 0:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited:
+            limiter.record_wait(waited)
+
+    async def handle_async_request(self, request):
+        call = scheduled_call(request)
+        if call is None:
+            return await self.transport.handle_async_request(request)
+        limiter, tokens = call
+        attempt = 0
+        while True:
+            await self.acquire(limiter, tokens)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except RETRY_ERRORS:
+                if attempt >= LLM_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt)
+                limiter.record_retry(None, delay)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= LLM_MAX_RETRIES:
+                    return response
+                delay = backoff_delay(attempt, response)
+                limiter.record_retry(response.status_code, delay)
+                await response.aclose()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+from util.sqlite_pool import pooled_connect
+from util.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Location and bounds of the conversation memory
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "sqlite3_db/sessions.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "50"))
+# Token budget of the history handed to the prompts; older messages are left out
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "1000"))
+# Minimum number of seconds between two sweeps of expired and surplus sessions
+SESSION_SWEEP_INTERVAL = 60
+
+schema_ready = False
+last_sweep = 0.0
+store_lock = threading.Lock()
+
+
+def connect_sessions():
+    """
+    Check out a pooled connection to the session store, creating its tables once per process.
+    """
+    global schema_ready
+    sqlite_conn = pooled_connect(SESSION_STORE_PATH)
+    with store_lock:
+        if not schema_ready:
+            sqlite_conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_access REAL)")
+            sqlite_conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, "
+                "message TEXT, tokens INTEGER)"
+            )
+            sqlite_conn.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+            sqlite_conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)")
+            sqlite_conn.commit()
+            schema_ready = True
+    return sqlite_conn
+
+
+def sweep_sessions(sqlite_conn):
+    """
+    Drop sessions idle for longer than the TTL, then the least recently used ones above the session cap.
+    """
+    global last_sweep
+    now = time.time()
+    with store_lock:
+        if now - last_sweep < SESSION_SWEEP_INTERVAL:
+            return
+        last_sweep = now
+    sqlite_conn.execute("DELETE FROM sessions WHERE last_access<?", (now - SESSION_TTL,))
+    count = sqlite_conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    if count > SESSION_MAX_SESSIONS:
+        sqlite_conn.execute(
+            "DELETE FROM sessions WHERE session_id IN "
+            "(SELECT session_id FROM sessions ORDER BY last_access LIMIT ?)", (count - SESSION_MAX_SESSIONS,))
+    sqlite_conn.execute("DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+    sqlite_conn.commit()
+
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat history of one session, persisted in SQLite and read back within a token budget.
+    """
+
+    def __init__(self, session_id, max_tokens=SESSION_HISTORY_TOKENS):
+        self.session_id = session_id
+        self.max_tokens = max_tokens
+
+    @property
+    def messages(self):
+        """
+        The most recent messages of the session that fit in the token budget, oldest first.
+        """
+        sqlite_conn = connect_sessions()
+        try:
+            sweep_sessions(sqlite_conn)
+            # A session idle for longer than the TTL starts over, even before the next sweep removes it
+            rows = sqlite_conn.execute(
+                "SELECT message, tokens FROM messages WHERE session_id=? AND EXISTS "
+                "(SELECT 1 FROM sessions WHERE session_id=? AND last_access>=?) ORDER BY id DESC LIMIT ?",
+                (self.session_id, self.session_id, time.time() - SESSION_TTL, SESSION_MAX_MESSAGES)).fetchall()
+        finally:
+            sqlite_conn.close()
+        kept = []
+        used = 0
+        for message, tokens in rows:
+            if used + tokens > self.max_tokens:
+                break
+            used += tokens
+            kept.append(json.loads(message))
+        return messages_from_dict(list(reversed(kept)))
+
+    def add_messages(self, messages):
+        now = time.time()
+        sqlite_conn = connect_sessions()
+        try:
+            # An expired session not swept yet must not bring its old messages back
+            sqlite_conn.execute(
+                "DELETE FROM messages WHERE session_id=? AND NOT EXISTS "
+                "(SELECT 1 FROM sessions WHERE session_id=? AND last_access>=?)",
+                (self.session_id, self.session_id, now - SESSION_TTL))
+            sqlite_conn.executemany(
+                "INSERT INTO messages (session_id, message, tokens) VALUES (?, ?, ?)",
+                [(self.session_id, json.dumps(message_to_dict(message)), count_tokens(str(message.content)))
+                 for message in messages])
+            sqlite_conn.execute("INSERT OR REPLACE INTO sessions (session_id, last_access) VALUES (?, ?)",
+                                (self.session_id, now))
+            # Only the newest messages of a session are ever read back
+            sqlite_conn.execute(
+                "DELETE FROM messages WHERE session_id=? AND id NOT IN "
+                "(SELECT id FROM messages WHERE session_id=? ORDER BY id DESC LIMIT ?)",
+                (self.session_id, self.session_id, SESSION_MAX_MESSAGES))
+            sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
+
+    def add_message(self, message):
+        self.add_messages([message])
+
+    def clear(self):
+        sqlite_conn = connect_sessions()
+        try:
+            sqlite_conn.execute("DELETE FROM messages WHERE session_id=?", (self.session_id,))
+            sqlite_conn.execute("DELETE FROM sessions WHERE session_id=?", (self.session_id,))
+            sqlite_conn.commit()
+        finally:
+            sqlite_conn.close()
@@ -0,0 +1,38 @@
+import json
+import logging
+from typing import Literal
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# Opt-in streaming formats of the answer endpoints
+StreamMode = Literal["sse", "ndjson"]
+
+MEDIA_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def format_event(event, data, mode):
+    """
+    Serialise one event as a Server-Sent Event or as an NDJSON line.
+    """
+    if mode == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, **data}) + "\n"
+
+
+async def encode_events(events, mode):
+    async for event, data in events:
+        yield format_event(event, data, mode)
+
+
+def stream_response(events, mode):
+    """
+    Wrap an async generator of (event, data) pairs into a streaming HTTP response.
+    """
+    # Ask proxies not to buffer, otherwise tokens arrive in one block at the end
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(encode_events(events, mode), media_type=MEDIA_TYPES[mode], headers=headers)
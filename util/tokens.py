@@ -0,0 +1,18 @@
+from functools import lru_cache
+
+import tiktoken
+
+# Encoding of the gpt-3.5/gpt-4 chat models
+TOKEN_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    return tiktoken.get_encoding(TOKEN_ENCODING)
+
+
+def count_tokens(text):
+    """
+    Number of tokens of a text for the chat models.
+    """
+    return len(get_encoding().encode(text))
@@ -0,0 +1,91 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import chromadb
+from langchain_community.vectorstores import Chroma
+
+from util.embedding_cache import get_embeddings
+
+logger = logging.getLogger(__name__)
+
+CHROMA_PERSIST_DIRECTORY = "chromadb_persist/"
+# Number of collection handles kept open at once
+COLLECTION_CACHE_SIZE = int(os.getenv("COLLECTION_CACHE_SIZE", "64"))
+
+chroma_client = None
+embedding_function = None
+vector_stores = OrderedDict()
+registry_lock = threading.RLock()
+
+
+def get_chroma_client():
+    """
+    Return the process-wide persistent Chroma client.
+    """
+    global chroma_client
+    with registry_lock:
+        if chroma_client is None:
+            chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY)
+    return chroma_client
+
+
+def get_embedding_function():
+    """
+    Return the process-wide (cached) embedding client.
+    """
+    global embedding_function
+    with registry_lock:
+        if embedding_function is None:
+            embedding_function = get_embeddings()
+    return embedding_function
+
+
+def get_vector_store(collection_name):
+    """
+    Return a vector store for the collection, re-using recently used handles.
+    """
+    with registry_lock:
+        if collection_name in vector_stores:
+            vector_stores.move_to_end(collection_name)
+            return vector_stores[collection_name]
+        vector_store = Chroma(client=get_chroma_client(), collection_name=collection_name,
+                              embedding_function=get_embedding_function())
+        vector_stores[collection_name] = vector_store
+        # Evict the least recently used handle above the size bound
+        if len(vector_stores) > COLLECTION_CACHE_SIZE:
+            vector_stores.popitem(last=False)
+        return vector_store
+
+
+def invalidate_collection(collection_name):
+    """
+    Forget the cached handle of a collection.
+    """
+    with registry_lock:
+        vector_stores.pop(collection_name, None)
+
+
+def delete_collection(collection_name):
+    """
+    Delete a collection from Chroma and drop its cached handle.
+    """
+    with registry_lock:
+        invalidate_collection(collection_name)
+        try:
+            get_chroma_client().delete_collection(name=collection_name)
+        except ValueError:
+            # The collection does not exist (e.g. entries of fine-tuning files)
+            logger.info(f"Collection {collection_name} does not exist, nothing to delete")
+
+
+def delete_all_collections():
+    """
+    Delete every collection from Chroma and empty the handle cache.
+    """
+    with registry_lock:
+        vector_stores.clear()
+        client = get_chroma_client()
+        for collection in client.list_collections():
+            client.delete_collection(name=collection.name)
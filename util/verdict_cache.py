@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from util.embedding_cache import hash_text
+
+logger = logging.getLogger(__name__)
+
+# Number of grader verdicts kept in memory per process
+VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", "50000"))
+
+verdict_cache = None
+verdict_cache_lock = threading.Lock()
+
+
+def normalize_question(question):
+    """
+    Case and whitespace insensitive form of a question, so trivially different phrasings share verdicts.
+    """
+    return " ".join(question.lower().split())
+
+
+def verdict_key(grader, prompt_version, model, question, content):
+    """
+    Cache key of a grader verdict.
+
+    Parameters:
+    grader (str): Name of the grader.
+    prompt_version (str): Version of the grader prompt; bumping it retires every verdict given under the old prompt.
+    model (str): Model that grades.
+    question (str): Question (or generation) the content is graded against.
+    content (str): Graded text.
+    """
+    return grader, prompt_version, model, hash_text(normalize_question(question)), hash_text(content)
+
+
+class VerdictCache:
+    """
+    Bounded LRU map of grader verdicts ('yes' or 'no').
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.verdicts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            verdict = self.verdicts.get(key)
+            if verdict is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.verdicts.move_to_end(key)
+            return verdict
+
+    def put(self, key, verdict):
+        with self.lock:
+            self.verdicts[key] = verdict
+            self.verdicts.move_to_end(key)
+            # Evict the least recently used verdicts above the size bound
+            while len(self.verdicts) > self.max_entries:
+                self.verdicts.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.verdicts.clear()
+
+    def stats(self):
+        """
+        Hit/miss counters of this process and the number of stored verdicts.
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "entries": len(self.verdicts)}
+
+
+def get_verdict_cache():
+    """
+    Return the process-wide verdict cache.
+    """
+    global verdict_cache
+    with verdict_cache_lock:
+        if verdict_cache is None:
+            verdict_cache = VerdictCache(VERDICT_CACHE_SIZE)
+    return verdict_cache
+
+
+def normalize_verdict(binary_score):
+    return binary_score.strip().lower()
+
+
+async def memoized_verdict(key, grader_chain, inputs, config=None):
+    """
+    Return the cached verdict for the key, or run the grader chain and remember its binary_score.
+    """
+    cache = get_verdict_cache()
+    verdict = cache.get(key)
+    if verdict is None:
+        score = await grader_chain.ainvoke(inputs, config=config)
+        verdict = normalize_verdict(score.binary_score)
+        cache.put(key, verdict)
+    return verdict